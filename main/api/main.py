@@ -2,11 +2,17 @@
 FastAPI web interface for Text2SQL.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Any, Optional
+import asyncio
 import logging
+import orjson
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from ..text2sql import Text2SQL
@@ -17,15 +23,25 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Text2SQL
-text2sql = Text2SQL()
+text2sql = Text2SQL.shared()
+
+# Knowledge base builds run one at a time on a dedicated worker thread,
+# off the request threadpool; status is tracked per task id
+build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-build")
+build_tasks: Dict[str, Dict[str, Any]] = {}
 
 # FastAPI app
 app = FastAPI(
     title="Text2SQL API",
     description="RAG-based Text-to-SQL API",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse
 )
 
+# Compress large schema/result payloads. Added before CORS so that CORS is
+# the outer middleware and answers preflight requests uncompressed.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -43,17 +59,25 @@ class QueryRequest(BaseModel):
 
 class QueryResponse(BaseModel):
     query: str
-    sql: Optional[str]
+    sql: Optional[str] = None
     is_valid: bool
-    execution_results: Optional[List[Dict[str, Any]]]
+    execution_results: Optional[List[Dict[str, Any]]] = None
     correction_attempts: int
-    error: Optional[str]
-    intermediate: Optional[Dict[str, Any]]
+    error: Optional[str] = None
+    intermediate: Optional[Dict[str, Any]] = None
 
 class BuildRequest(BaseModel):
     force_rebuild: bool = Field(default=False, description="Force rebuild even if exists")
     business_rules: Optional[Dict[str, Any]] = Field(default=None, description="Business rules")
 
+class BuildStatusResponse(BaseModel):
+    task_id: str
+    status: str
+    submitted_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+
 class BusinessRuleRequest(BaseModel):
     rule_name: str = Field(..., description="Name of the business rule")
     rule_definition: str = Field(..., description="Definition of the business rule")
@@ -63,8 +87,13 @@ class ValidateRequest(BaseModel):
 
 class ValidateResponse(BaseModel):
     is_valid: bool
-    error: Optional[str]
-    fixed_sql: Optional[str]
+    error: Optional[str] = None
+    fixed_sql: Optional[str] = None
+
+@app.on_event("startup")
+async def warm_up():
+    """Load the LLM before the first request arrives."""
+    await asyncio.to_thread(text2sql.warm_up)
 
 @app.get("/")
 async def root():
@@ -79,7 +108,8 @@ async def root():
 async def query_to_sql(request: QueryRequest):
     """Convert natural language query to SQL."""
     try:
-        result = text2sql.query_to_sql(
+        # Blocking steps run in worker threads; corrections are requested concurrently
+        result = await text2sql.aquery_to_sql(
             query=request.query,
             max_correction_attempts=request.max_corrections,
             return_intermediate=request.show_intermediate
@@ -89,26 +119,99 @@ async def query_to_sql(request: QueryRequest):
         logger.error(f"Error in query_to_sql: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_to_sql_stream(request: QueryRequest):
+    """
+    Convert natural language query to SQL, streaming progress as
+    Server-Sent Events: retrieved_context, draft_sql, one correction event
+    per attempt, then result (or error).
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    
+    def on_event(event: str, data: Dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+    
+    async def run() -> None:
+        try:
+            result = await asyncio.to_thread(
+                text2sql.query_to_sql,
+                query=request.query,
+                max_correction_attempts=request.max_corrections,
+                return_intermediate=request.show_intermediate,
+                on_event=on_event
+            )
+            await events.put(('result', QueryResponse(**result).model_dump()))
+        except Exception as e:
+            logger.error(f"Error in query_to_sql_stream: {e}")
+            await events.put(('error', {'detail': str(e)}))
+    
+    async def event_stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event, data = await events.get()
+                payload = orjson.dumps(data, default=str).decode()
+                yield f"event: {event}\ndata: {payload}\n\n"
+                if event in ('result', 'error'):
+                    break
+        finally:
+            await task
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+def _run_build(task_id: str, business_rules: Optional[Dict[str, Any]], force_rebuild: bool) -> None:
+    """Run a knowledge base build and record its outcome."""
+    task = build_tasks[task_id]
+    task['status'] = 'running'
+    task['started_at'] = datetime.now().isoformat()
+    try:
+        text2sql.build_knowledge_base(
+            business_rules=business_rules,
+            force_rebuild=force_rebuild
+        )
+        task['status'] = 'completed'
+    except Exception as e:
+        logger.error(f"Knowledge base build {task_id} failed: {e}")
+        task['status'] = 'failed'
+        task['error'] = str(e)
+    finally:
+        task['finished_at'] = datetime.now().isoformat()
+
 @app.post("/build")
-async def build_knowledge_base(request: BuildRequest, background_tasks: BackgroundTasks):
+async def build_knowledge_base(request: BuildRequest):
     """Build knowledge base from database metadata."""
     try:
-        # Run in background for long operations
-        background_tasks.add_task(
-            text2sql.build_knowledge_base,
-            business_rules=request.business_rules,
-            force_rebuild=request.force_rebuild
+        task_id = uuid.uuid4().hex
+        build_tasks[task_id] = {
+            'task_id': task_id,
+            'status': 'pending',
+            'submitted_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+        build_executor.submit(
+            _run_build, task_id, request.business_rules, request.force_rebuild
         )
-        return {"message": "Knowledge base building started"}
+        return {"message": "Knowledge base building started", "task_id": task_id}
     except Exception as e:
         logger.error(f"Error building knowledge base: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/build/{task_id}", response_model=BuildStatusResponse)
+async def get_build_status(task_id: str):
+    """Get the status of a knowledge base build."""
+    task = build_tasks.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Unknown build task: {task_id}")
+    return BuildStatusResponse(**task)
+
 @app.get("/schema")
 async def get_schema(table_name: Optional[str] = None):
     """Get database schema information."""
     try:
-        schema_info = text2sql.get_schema_info(table_name)
+        schema_info = await asyncio.to_thread(text2sql.get_schema_info, table_name)
         return schema_info
     except Exception as e:
         logger.error(f"Error getting schema: {e}")
@@ -118,7 +221,8 @@ async def get_schema(table_name: Optional[str] = None):
 async def add_business_rule(request: BusinessRuleRequest):
     """Add a business rule to the knowledge base."""
     try:
-        text2sql.add_business_rule(
+        await asyncio.to_thread(
+            text2sql.add_business_rule,
             rule_name=request.rule_name,
             rule_definition=request.rule_definition
         )
@@ -133,7 +237,9 @@ async def validate_sql(request: ValidateRequest):
     try:
         # For validation, we need schema context
         # This is a simplified version
-        is_valid, error = text2sql.sql_validator.validate_syntax(request.sql)
+        is_valid, error = await asyncio.to_thread(
+            text2sql.sql_validator.validate_syntax, request.sql
+        )
         return ValidateResponse(
             is_valid=is_valid,
             error=error,
@@ -147,7 +253,7 @@ async def validate_sql(request: ValidateRequest):
 async def get_stats():
     """Get system statistics."""
     try:
-        stats = text2sql.get_stats()
+        stats = await asyncio.to_thread(text2sql.get_stats)
         return stats
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
@@ -11,7 +11,6 @@ from rich.table import Table
 from rich.panel import Panel
 from rich.syntax import Syntax
 
-from .text2sql import Text2SQL
 from .config import settings
 
 
@@ -26,6 +25,15 @@ logger = logging.getLogger(__name__)
 console = Console()
 
 
+def _get_text2sql(db_url: str):
+    """
+    Get the shared Text2SQL instance, importing it on first use so
+    --help and argument errors don't load torch, chromadb or SQLAlchemy.
+    """
+    from .text2sql import Text2SQL
+    return Text2SQL.shared(db_url)
+
+
 @click.group()
 @click.option('--db-url', envvar='DATABASE_URL', help='Database connection URL')
 @click.option('--verbose', '-v', is_flag=True, help='Verbose output')
@@ -55,7 +63,7 @@ def build(ctx, force, business_rules):
             rules = json.load(f)
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         text2sql.build_knowledge_base(business_rules=rules, force_rebuild=force)
@@ -80,7 +88,7 @@ def query(ctx, query, show_intermediate, max_corrections):
     console.print(f"[bold blue]Query:[/bold blue] {query}")
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         # Convert query to SQL
@@ -143,7 +151,7 @@ def validate(ctx, sql):
     console.print("[bold blue]Validating SQL...[/bold blue]")
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         # Validate syntax
@@ -172,7 +180,7 @@ def validate(ctx, sql):
 def schema(ctx, table_name):
     """Show database schema information."""
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         if table_name:
@@ -210,7 +218,7 @@ def add_rule(ctx, rule_name, rule_definition):
     console.print(f"[bold blue]Adding business rule: {rule_name}[/bold blue]")
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         text2sql.add_business_rule(rule_name, rule_definition)
@@ -229,7 +237,7 @@ def export(ctx, output_file):
     console.print(f"[bold blue]Exporting knowledge base to {output_file}...[/bold blue]")
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         text2sql.export_knowledge_base(output_file)
@@ -254,7 +262,7 @@ def import_kb(ctx, input_file, force):
     console.print(f"[bold blue]Importing knowledge base from {input_file}...[/bold blue]")
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         text2sql.import_knowledge_base(input_file)
@@ -270,7 +278,7 @@ def import_kb(ctx, input_file, force):
 def stats(ctx):
     """Show system statistics."""
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
     
     try:
         stats = text2sql.get_stats()
@@ -300,7 +308,8 @@ def interactive(ctx):
     console.print("Type 'exit' or 'quit' to exit\n")
     
     # Initialize Text2SQL
-    text2sql = Text2SQL(database_url=ctx.obj['db_url'])
+    text2sql = _get_text2sql(ctx.obj['db_url'])
+    text2sql.warm_up()
     
     while True:
         try:
@@ -1,53 +1,72 @@
 import os
 from typing import Optional, Dict, Any
-from pydantic import BaseSettings, Field
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     """Application settings with environment variable support."""
     
     # LLM Configuration
-    llm_model_name: str = Field(default="deepseek-r1:32b", env="LLM_MODEL_NAME")
-    llm_base_url: str = Field(default="http://localhost:11434", env="LLM_BASE_URL")
-    llm_temperature: float = Field(default=0.1, env="LLM_TEMPERATURE")
-    llm_max_tokens: int = Field(default=2048, env="LLM_MAX_TOKENS")
+    llm_model_name: str = Field(default="deepseek-r1:32b")
+    llm_base_url: str = Field(default="http://localhost:11434")
+    llm_temperature: float = Field(default=0.1)
+    llm_max_tokens: int = Field(default=2048)
+    llm_timeout: int = Field(default=120)
+    llm_batch_size: int = Field(default=4)  # concurrent requests per bin; match OLLAMA_NUM_PARALLEL
     
     # Embedding Model Configuration
-    embedding_model_name: str = Field(
-        default="BAAI/bge-large-zh", 
-        env="EMBEDDING_MODEL_NAME"
-    )
-    embedding_device: str = Field(default="cpu", env="EMBEDDING_DEVICE")
+    embedding_model_name: str = Field(default="BAAI/bge-large-zh")
+    embedding_device: str = Field(default="cpu")
+    embedding_batch_size: int = Field(default=32)
+    embedding_precision: str = Field(default="float32")  # or "int8"
     
     # Vector Database Configuration
-    vector_db_path: str = Field(default="./chroma_db", env="VECTOR_DB_PATH")
-    vector_db_collection_name: str = Field(
-        default="text2sql_knowledge", 
-        env="VECTOR_DB_COLLECTION_NAME"
-    )
+    vector_db_path: str = Field(default="./chroma_db")
+    vector_db_collection_name: str = Field(default="text2sql_knowledge")
+    # HNSW index parameters; space and M only apply when the collection is created
+    vector_db_hnsw_space: str = Field(default="cosine")
+    vector_db_hnsw_construction_ef: int = Field(default=200)
+    vector_db_hnsw_search_ef: int = Field(default=100)
+    vector_db_hnsw_m: int = Field(default=16)
+    vector_db_allow_reset: bool = Field(default=False)
+    # Comma-separated onnxruntime providers for the MiniLM embedder, in preference order
+    vector_db_onnx_providers: str = Field(default="CPUExecutionProvider")
     
     # Database Configuration
-    db_type: str = Field(default="mysql", env="DB_TYPE")
-    db_host: str = Field(default="localhost", env="DB_HOST")
-    db_port: int = Field(default=3306, env="DB_PORT")
-    db_user: str = Field(default="root", env="DB_USER")
-    db_password: str = Field(default="", env="DB_PASSWORD")
-    db_name: str = Field(default="target_db", env="DB_NAME")
+    db_type: str = Field(default="mysql")
+    db_host: str = Field(default="localhost")
+    db_port: int = Field(default=3306)
+    db_user: str = Field(default="root")
+    db_password: str = Field(default="")
+    db_name: str = Field(default="target_db")
+    db_pool_size: int = Field(default=20)
+    db_max_overflow: int = Field(default=40)
+    db_pool_pre_ping: bool = Field(default=True)
+    db_pool_recycle: int = Field(default=3600)
+    # Count rows exactly (COUNT(*)) on databases without a statistics catalog
+    db_exact_row_counts: bool = Field(default=True)
     
     # Application Configuration
-    app_host: str = Field(default="0.0.0.0", env="APP_HOST")
-    app_port: int = Field(default=8000, env="APP_PORT")
-    debug: bool = Field(default=True, env="DEBUG")
+    app_host: str = Field(default="0.0.0.0")
+    app_port: int = Field(default=8000)
+    debug: bool = Field(default=True)
     
     # RAG Configuration
-    rag_top_k: int = Field(default=3, env="RAG_TOP_K")
-    rag_score_threshold: float = Field(default=0.5, env="RAG_SCORE_THRESHOLD")
-    rag_chunk_size: int = Field(default=1000, env="RAG_CHUNK_SIZE")
-    rag_chunk_overlap: int = Field(default=200, env="RAG_CHUNK_OVERLAP")
+    rag_top_k: int = Field(default=3)
+    rag_score_threshold: float = Field(default=0.5)
+    rag_chunk_size: int = Field(default=1000)
+    rag_chunk_overlap: int = Field(default=200)
+    
+    # Semantic Cache Configuration
+    semantic_cache_enabled: bool = Field(default=True)
+    semantic_cache_threshold: float = Field(default=0.92)
+    semantic_cache_max_size: int = Field(default=1000)
+    semantic_cache_ttl: int = Field(default=3600)
     
     # Validation Configuration
-    max_correction_attempts: int = Field(default=3, env="MAX_CORRECTION_ATTEMPTS")
-    sql_timeout: int = Field(default=30, env="SQL_TIMEOUT")
+    max_correction_attempts: int = Field(default=3)
+    sql_timeout: int = Field(default=30)
     
     @property
     def database_url(self) -> str:
@@ -59,9 +78,12 @@ class Settings(BaseSettings):
         else:
             raise ValueError(f"Unsupported database type: {self.db_type}")
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
+    # Field names map case-insensitively onto the upper-case env variables
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        extra="ignore"
+    )
 
 
 # Global settings instance
@@ -2,9 +2,14 @@
 Core module initialization.
 """
 
-from .config import settings
+from ..config import settings
 from .llm import LLMManager
 from .embedding import EmbeddingManager
 from .vector_db import VectorDBManager
+from .semantic_cache import SemanticCache
+from .database import get_engine
 
-__all__ = ["settings", "LLMManager", "EmbeddingManager", "VectorDBManager"]
\ No newline at end of file
+__all__ = [
+    "settings", "LLMManager", "EmbeddingManager", "VectorDBManager",
+    "SemanticCache", "get_engine"
+]
\ No newline at end of file
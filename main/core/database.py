@@ -0,0 +1,57 @@
+import logging
+from functools import lru_cache
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL drivers that pass libpq's 'options' to the server on connect
+LIBPQ_DRIVERS = frozenset({'psycopg2', 'psycopg'})
+
+
+@lru_cache(maxsize=None)
+def get_engine(database_url: str = None) -> Engine:
+    """
+    Get a pooled SQLAlchemy engine, shared per database URL.
+    
+    Args:
+        database_url: Database connection URL (uses settings if None)
+        
+    Returns:
+        SQLAlchemy engine
+    """
+    if database_url is None:
+        database_url = settings.database_url
+    
+    url = make_url(database_url)
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql' and url.get_driver_name() in LIBPQ_DRIVERS:
+        # Default statement timeout for every pooled connection, so queries
+        # don't need their own SET round trip; keeps any options in the URL
+        timeout_option = f"-c statement_timeout={settings.sql_timeout * 1000}"
+        url_options = url.query.get('options')
+        connect_args['options'] = f"{url_options} {timeout_option}" if url_options else timeout_option
+    
+    # Pool sizing only applies to QueuePool; e.g. in-memory SQLite uses
+    # SingletonThreadPool, which rejects those arguments
+    pool_args = {}
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        pool_args = {
+            'pool_size': settings.db_pool_size,
+            'max_overflow': settings.db_max_overflow
+        }
+    
+    engine = create_engine(
+        database_url,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
+        connect_args=connect_args,
+        **pool_args
+    )
+    logger.debug(f"Created engine with pool {type(engine.pool).__name__} {pool_args}")
+    return engine
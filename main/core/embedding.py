@@ -1,10 +1,92 @@
 import logging
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 import numpy as np
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+try:
+    import faiss
+except ImportError:  # optional: pip install text2sql[ann]
+    faiss = None
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:  # optional: pip install text2sql[jit]
+    numba = None
+
 from ..config import settings
 
+# Below this corpus size exact search is as fast as walking an HNSW graph
+ANN_MIN_DOCUMENTS = 4096
+
+# Below this many matrix elements the JIT kernel loses to a single BLAS call
+JIT_MIN_ELEMENTS = 10 ** 6
+
+# Rows upcast at a time when scoring an int8/float16 corpus
+SCORE_BLOCK = 8192
+
+
+def _quantize_int8(embeddings: np.ndarray):
+    """Symmetric per-row int8 quantization; returns (int8 matrix, float32 scales)."""
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.rint(embeddings / scales[:, np.newaxis]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _grow(buffer: Optional[np.ndarray], used: int, needed: int, row_shape: tuple, dtype) -> np.ndarray:
+    """Return a buffer holding at least `needed` rows, growing by 1.5x."""
+    if buffer is None:
+        return np.empty((needed,) + row_shape, dtype=dtype)
+    if needed <= buffer.shape[0]:
+        return buffer
+    capacity = max(needed, int(buffer.shape[0] * 1.5))
+    grown = np.empty((capacity,) + row_shape, dtype=dtype)
+    grown[:used] = buffer[:used]
+    return grown
+
+
+if numba is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _topk_ip(doc_matrix, query_vec, k):
+        """Fused inner product + per-thread top-k; returns k candidates per block."""
+        n, d = doc_matrix.shape
+        n_blocks = numba.get_num_threads()
+        block = (n + n_blocks - 1) // n_blocks
+        best_scores = np.full((n_blocks, k), -np.inf, dtype=np.float32)
+        best_idx = np.full((n_blocks, k), -1, dtype=np.int64)
+        
+        for b in prange(n_blocks):
+            for i in range(b * block, min((b + 1) * block, n)):
+                score = 0.0
+                for j in range(d):
+                    score += doc_matrix[i, j] * query_vec[j]
+                
+                # Insertion into the block's descending top-k list
+                if score > best_scores[b, k - 1]:
+                    pos = k - 1
+                    while pos > 0 and best_scores[b, pos - 1] < score:
+                        best_scores[b, pos] = best_scores[b, pos - 1]
+                        best_idx[b, pos] = best_idx[b, pos - 1]
+                        pos -= 1
+                    best_scores[b, pos] = score
+                    best_idx[b, pos] = i
+        
+        return best_scores.ravel(), best_idx.ravel()
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_name: str, device: str) -> "SentenceTransformer":
+    """Load a sentence transformer once per process for each (model, device)."""
+    # Imported here: it pulls in torch, which dominates startup
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, device=device)
+
 
 class EmbeddingManager:
     """Manages text embeddings for the RAG system."""
@@ -12,14 +94,30 @@ class EmbeddingManager:
     def __init__(self):
         """Initialize the embedding manager."""
         self.logger = logging.getLogger(__name__)
-        self.model = self._initialize_model()
+        self._model = None  # loaded on first use, see model
         
-    def _initialize_model(self) -> SentenceTransformer:
+        # Corpus embeddings, over-allocated so appends are amortised O(1)
+        self._doc_buffer: Optional[np.ndarray] = None
+        self._doc_scales: Optional[np.ndarray] = None  # per-row scale for int8
+        self._doc_count = 0
+        self._index = None
+        
+        # Per-thread score buffers reused across queries on the registered corpus
+        self._local = threading.local()
+        
+    @property
+    def model(self) -> "SentenceTransformer":
+        """The sentence transformer, loaded on first access."""
+        if self._model is None:
+            self._model = self._initialize_model()
+        return self._model
+    
+    def _initialize_model(self) -> "SentenceTransformer":
         """Initialize the sentence transformer model."""
         try:
-            model = SentenceTransformer(
+            model = _load_model(
                 settings.embedding_model_name,
-                device=settings.embedding_device
+                settings.embedding_device
             )
             self.logger.info(f"Embedding model loaded: {settings.embedding_model_name}")
             return model
@@ -27,7 +125,7 @@ class EmbeddingManager:
             self.logger.error(f"Failed to load embedding model: {e}")
             raise
     
-    def embed_documents(self, documents: List[str]) -> List[List[float]]:
+    def embed_documents(self, documents: List[str]) -> np.ndarray:
         """
         Generate embeddings for a list of documents.
         
@@ -35,20 +133,24 @@ class EmbeddingManager:
             documents: List of text documents
             
         Returns:
-            List of embedding vectors
+            Float32 matrix of shape (len(documents), dim)
         """
         try:
+            # encode() length-sorts its input before batching, so each batch
+            # is padded only to its own longest item
             embeddings = self.model.encode(
                 documents,
+                batch_size=settings.embedding_batch_size,
                 convert_to_numpy=True,
-                normalize_embeddings=True
+                normalize_embeddings=True,
+                show_progress_bar=False
             )
-            return embeddings.tolist()
+            return np.ascontiguousarray(embeddings, dtype=np.float32)
         except Exception as e:
             self.logger.error(f"Error generating embeddings: {e}")
             raise
     
-    def embed_query(self, query: str) -> List[float]:
+    def embed_query(self, query: str) -> np.ndarray:
         """
         Generate embedding for a single query.
         
@@ -56,7 +158,7 @@ class EmbeddingManager:
             query: Query text
             
         Returns:
-            Query embedding vector
+            Float32 query embedding vector
         """
         try:
             embedding = self.model.encode(
@@ -64,15 +166,179 @@ class EmbeddingManager:
                 convert_to_numpy=True,
                 normalize_embeddings=True
             )
-            return embedding.tolist()
+            return np.ascontiguousarray(embedding, dtype=np.float32)
         except Exception as e:
             self.logger.error(f"Error generating query embedding: {e}")
             raise
     
+    @property
+    def document_matrix(self) -> Optional[np.ndarray]:
+        """
+        Float32 view of the registered corpus embeddings, or None if empty.
+        
+        An int8 or mmap'd float16 corpus is converted into a new array.
+        """
+        if self._doc_buffer is None:
+            return None
+        matrix = self._doc_buffer[:self._doc_count]
+        if self._doc_scales is not None:
+            return matrix.astype(np.float32) * self._doc_scales[:self._doc_count, np.newaxis]
+        return np.asarray(matrix, dtype=np.float32)
+    
+    def register_documents(self, embeddings: np.ndarray) -> None:
+        """
+        Append document embeddings to the cached corpus matrix.
+        
+        Args:
+            embeddings: Matrix of shape (n, dim); rows are L2-normalized if
+                they are not already
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[np.newaxis, :]
+        
+        # Normalize once here so searches can score with a bare inner product
+        norms = np.sqrt(np.einsum('ij,ij->i', embeddings, embeddings))
+        if not np.allclose(norms, 1.0, atol=1e-3):
+            embeddings = embeddings / np.maximum(norms, 1e-12)[:, np.newaxis]
+        
+        needed = self._doc_count + embeddings.shape[0]
+        if settings.embedding_precision == "int8":
+            # A float corpus (e.g. loaded by load_corpus) is quantized first,
+            # never cast row by row into the int8 buffer
+            if self._doc_buffer is not None and self._doc_scales is None:
+                self._quantize_corpus()
+            quantized, scales = _quantize_int8(embeddings)
+            self._doc_buffer = _grow(self._doc_buffer, self._doc_count, needed, quantized.shape[1:], np.int8)
+            self._doc_scales = _grow(self._doc_scales, self._doc_count, needed, (), np.float32)
+            self._doc_buffer[self._doc_count:needed] = quantized
+            self._doc_scales[self._doc_count:needed] = scales
+        else:
+            # Grow in the corpus's own dtype, so a loaded float16 corpus stays float16
+            dtype = self._doc_buffer.dtype if self._doc_buffer is not None else np.float32
+            self._doc_buffer = _grow(self._doc_buffer, self._doc_count, needed, embeddings.shape[1:], dtype)
+            self._doc_buffer[self._doc_count:needed] = embeddings
+        self._doc_count = needed
+        
+        if self._index is not None:
+            self._index.add(embeddings)
+    
+    def _quantize_corpus(self) -> None:
+        """Convert a float corpus to the int8 layout, filling per-row scales."""
+        quantized = np.empty(self._doc_buffer[:self._doc_count].shape, dtype=np.int8)
+        scales = np.empty(self._doc_count, dtype=np.float32)
+        for start in range(0, self._doc_count, SCORE_BLOCK):
+            end = min(start + SCORE_BLOCK, self._doc_count)
+            quantized[start:end], scales[start:end] = _quantize_int8(
+                self._doc_buffer[start:end].astype(np.float32)
+            )
+        self._doc_buffer = quantized
+        self._doc_scales = scales
+    
+    def clear_documents(self) -> None:
+        """Drop all registered corpus embeddings."""
+        self._doc_buffer = None
+        self._doc_scales = None
+        self._doc_count = 0
+        self._index = None
+    
+    def _get_ann_index(self):
+        """Lazily build an HNSW inner-product index over the registered corpus."""
+        if faiss is None or self._doc_count < ANN_MIN_DOCUMENTS:
+            return None
+        
+        if self._index is None:
+            doc_matrix = self.document_matrix
+            dim = doc_matrix.shape[1]
+            if self._doc_scales is not None:
+                index = faiss.IndexHNSWSQ(
+                    dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT
+                )
+                index.train(doc_matrix)
+            else:
+                index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.add(doc_matrix)
+            self._index = index
+            self.logger.info(f"Built HNSW index over {self._doc_count} documents")
+        
+        return self._index
+    
+    def save_corpus(self, path: str, ids: Optional[List[str]] = None) -> None:
+        """
+        Save the registered corpus as a float16 .npy file for mmap loading.
+        
+        Args:
+            path: Output .npy file path
+            ids: Optional document IDs, saved to a sidecar "<name>.ids.npy"
+        """
+        try:
+            matrix = self.document_matrix
+            if matrix is None:
+                raise ValueError("No documents registered")
+            
+            path = Path(path)
+            np.save(path, matrix.astype(np.float16))
+            if ids is not None:
+                np.save(path.with_suffix('.ids.npy'), np.asarray(ids, dtype=str))
+            
+            self.logger.info(f"Saved {self._doc_count} corpus embeddings to {path}")
+        except Exception as e:
+            self.logger.error(f"Error saving corpus embeddings: {e}")
+            raise
+    
+    def load_corpus(self, path: str) -> Optional[List[str]]:
+        """
+        Memory-map a corpus saved by save_corpus, replacing registered documents.
+        
+        With int8 precision the corpus is quantized into memory instead.
+        
+        Args:
+            path: .npy file path
+            
+        Returns:
+            Document IDs if a sidecar file exists, else None
+        """
+        try:
+            path = Path(path)
+            self.clear_documents()
+            self._doc_buffer = np.load(path, mmap_mode='r')
+            self._doc_count = self._doc_buffer.shape[0]
+            if settings.embedding_precision == "int8":
+                # Match the layout register_documents appends in
+                self._quantize_corpus()
+            
+            ids_path = path.with_suffix('.ids.npy')
+            ids = np.load(ids_path).tolist() if ids_path.exists() else None
+            
+            self.logger.info(f"Loaded {self._doc_count} corpus embeddings from {path}")
+            return ids
+        except Exception as e:
+            self.logger.error(f"Error loading corpus embeddings: {e}")
+            raise
+    
+    def _scores_buffer(self) -> np.ndarray:
+        """This thread's reusable float32 buffer sized to the registered corpus."""
+        buffer = getattr(self._local, 'scores', None)
+        if buffer is None or buffer.shape[0] < self._doc_count:
+            buffer = np.empty(max(self._doc_count, 1024), dtype=np.float32)
+            self._local.scores = buffer
+        return buffer[:self._doc_count]
+    
+    def _blockwise_scores(self, query_vec: np.ndarray) -> np.ndarray:
+        """Score a compact (int8/float16) corpus block by block to bound float32 temporaries."""
+        scores = np.empty(self._doc_count, dtype=np.float32)
+        for start in range(0, self._doc_count, SCORE_BLOCK):
+            end = min(start + SCORE_BLOCK, self._doc_count)
+            block = self._doc_buffer[start:end].astype(np.float32)
+            scores[start:end] = block @ query_vec
+            if self._doc_scales is not None:
+                scores[start:end] *= self._doc_scales[start:end]
+        return scores
+    
     def similarity_search(
         self, 
-        query_embedding: List[float], 
-        document_embeddings: List[List[float]],
+        query_embedding: np.ndarray, 
+        document_embeddings: Optional[np.ndarray] = None,
         top_k: int = 5
     ) -> List[Dict[str, Any]]:
         """
@@ -80,22 +346,56 @@ class EmbeddingManager:
         
         Args:
             query_embedding: Query embedding vector
-            document_embeddings: List of document embedding vectors
+            document_embeddings: Document embedding matrix (defaults to the
+                registered corpus)
             top_k: Number of top results to return
             
         Returns:
             List of dictionaries with index and similarity score
         """
         try:
-            # Convert to numpy arrays
-            query_vec = np.array(query_embedding)
-            doc_vecs = np.array(document_embeddings)
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+            if document_embeddings is None:
+                if self._doc_count == 0:
+                    return []
+                
+                # Embeddings are normalized, so inner product == cosine
+                index = self._get_ann_index()
+                if index is not None:
+                    scores, indices = index.search(query_vec.reshape(1, -1), top_k)
+                    return [
+                        {"index": int(idx), "score": float(score)}
+                        for idx, score in zip(indices[0], scores[0])
+                        if idx >= 0
+                    ]
+                
+                doc_vecs = self._doc_buffer[:self._doc_count]
+            else:
+                doc_vecs = np.asarray(document_embeddings, dtype=np.float32)
+            
+            k = min(top_k, doc_vecs.shape[0])
+            if k <= 0:
+                return []
             
-            # Calculate cosine similarity
-            similarities = np.dot(doc_vecs, query_vec)
+            if doc_vecs.dtype != np.float32:
+                similarities = self._blockwise_scores(query_vec)
+            elif document_embeddings is None and doc_vecs.size < JIT_MIN_ELEMENTS:
+                similarities = np.matmul(doc_vecs, query_vec, out=self._scores_buffer())
+            elif numba is not None and doc_vecs.size >= JIT_MIN_ELEMENTS:
+                scores, indices = _topk_ip(doc_vecs, query_vec, k)
+                order = np.argsort(-scores)[:k]
+                return [
+                    {"index": int(indices[i]), "score": float(scores[i])}
+                    for i in order
+                    if indices[i] >= 0
+                ]
+            else:
+                # Calculate cosine similarity
+                similarities = doc_vecs @ query_vec
             
-            # Get top-k results
-            top_indices = np.argsort(similarities)[::-1][:top_k]
+            # Get top-k results: partition in O(N), then sort only the k winners
+            top_indices = np.argpartition(-similarities, k - 1)[:k]
+            top_indices = top_indices[np.argsort(-similarities[top_indices])]
             
             results = [
                 {
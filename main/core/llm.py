@@ -1,55 +1,228 @@
+import asyncio
 import logging
-from typing import Optional, Dict, Any
-from langchain_community.llms import Ollama
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import re
+import weakref
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
+import httpx
+import numpy as np
+from ollama import AsyncClient, Client
 
+from .semantic_cache import SemanticCache
 from ..config import settings
 
+_SQL_BLOCK_RE = re.compile(r"```sql\s*(.*?)\s*```", re.DOTALL)
+_SQL_BATCH_BLOCK_RE = re.compile(r"```sql\s*\[(\d+)\]\s*(.*?)```", re.DOTALL)
+_SQL_START_RE = re.compile(r'^(SELECT|WITH|INSERT|UPDATE|DELETE)\b', re.I)
+
+# Static part of the SQL generation prompt, stripped once at import
+_PROMPT_TMPL = """
+你是一个世界级的数据库专家和SQL工程师。你的任务是根据用户的问题和提供的数据表结构，生成一段准确、高效的SQL查询。
+
+请严格遵循以下规则：
+1. 只使用提供的表和字段。
+2. 注意表之间的关联关系。
+3. 如果问题的计算逻辑复杂，请使用CTE（WITH语句）来保证SQL的可读性。
+4. 不要编造任何不存在的字段。
+5. 返回的SQL必须语法正确且可执行。
+
+数据表结构：
+{schema}
+
+{biz}
+
+{fs}
+
+现在，请根据以上信息，为以下问题生成SQL：
+"{q}"
+
+请将SQL代码包裹在```sql ... ```中。
+""".strip()
+
+# Question keywords that usually mean a long query (CTEs, grouping, ranking)
+_LONG_SQL_HINTS = (
+    '每', '分组', '排名', '前', '同比', '环比', '占比', '趋势', '累计', '平均',
+    'group', 'rank', 'top', 'each', 'per', 'trend', 'ratio', 'average'
+)
+
+# Output tokens budgeted per SQL statement when packing questions into one prompt
+BATCH_TOKENS_PER_SQL = 256
+
+
+@lru_cache(maxsize=256)
+def _build_prompt_cached(
+    prompt: str,
+    schema_context: str,
+    business_context: Optional[str],
+    few_shot_examples: Optional[str]
+) -> str:
+    """Fill the SQL generation template; repeats of the same inputs are free."""
+    return _PROMPT_TMPL.format(
+        schema=schema_context,
+        biz=business_context or '',
+        fs=few_shot_examples or '',
+        q=prompt
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_client(base_url: str) -> Client:
+    """Ollama client shared per base URL so keep-alive connections are reused."""
+    return Client(
+        host=base_url,
+        timeout=settings.llm_timeout,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    )
+
 
 class LLMManager:
     """Manages LLM interactions for SQL generation."""
     
-    def __init__(self):
-        """Initialize the LLM manager."""
+    def __init__(self, sql_cache: Optional[SemanticCache] = None):
+        """
+        Initialize the LLM manager.
+        
+        Args:
+            sql_cache: Optional semantic cache of question -> generated SQL
+        """
         self.logger = logging.getLogger(__name__)
         self.llm = self._initialize_llm()
-        self.output_parser = StrOutputParser()
+        self.sql_cache = sql_cache
         
-    def _initialize_llm(self) -> Ollama:
-        """Initialize the Ollama LLM."""
+        # One async client per event loop, created on first use there: an
+        # httpx pool is bound to the loop it was opened on
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        
+    def _initialize_llm(self) -> Client:
+        """Initialize the Ollama client."""
         try:
-            llm = Ollama(
-                model=settings.llm_model_name,
-                base_url=settings.llm_base_url,
-                temperature=settings.llm_temperature,
-                num_predict=settings.llm_max_tokens,
-            )
+            llm = _get_client(settings.llm_base_url)
             self.logger.info(f"LLM initialized with model: {settings.llm_model_name}")
             return llm
         except Exception as e:
             self.logger.error(f"Failed to initialize LLM: {e}")
             raise
     
+    def warm_up(self) -> None:
+        """Ask Ollama to load the model now so the first query skips the load."""
+        try:
+            # An empty prompt loads the model without generating anything
+            self.llm.generate(model=settings.llm_model_name, prompt='')
+            self.logger.info(f"LLM model warmed up: {settings.llm_model_name}")
+        except Exception as e:
+            self.logger.warning(f"Could not warm up LLM: {e}")
+    
+    def _invoke(self, prompt: str, stop_at_sql_block: bool = False) -> str:
+        """
+        Run a single completion against the configured model.
+        
+        Args:
+            prompt: Complete prompt
+            stop_at_sql_block: Stop streaming once the first ```sql block is
+                closed, instead of waiting for any trailing explanation
+                
+        Returns:
+            Model output (truncated after the SQL block when stopping early)
+        """
+        stream = self.llm.generate(
+            model=settings.llm_model_name,
+            prompt=prompt,
+            stream=True,
+            options={
+                'temperature': settings.llm_temperature,
+                'num_predict': settings.llm_max_tokens
+            }
+        )
+        parts = []
+        for chunk in stream:
+            parts.append(chunk['response'])
+            if stop_at_sql_block and self._sql_block_closed(parts):
+                # Closing the stream makes Ollama stop decoding
+                stream.close()
+                break
+        return ''.join(parts)
+    
+    def _sql_block_closed(self, parts: List[str]) -> bool:
+        """Whether the streamed output so far contains a complete ```sql block."""
+        # A block can only have closed in a chunk containing a backtick
+        return '`' in parts[-1] and _SQL_BLOCK_RE.search(''.join(parts)) is not None
+    
+    def _get_async_client(self) -> AsyncClient:
+        """The async client for the running event loop, created on first use."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncClient(
+                host=settings.llm_base_url,
+                timeout=settings.llm_timeout,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            )
+            self._async_clients[loop] = client
+        return client
+    
+    async def _ainvoke(
+        self,
+        prompt: str,
+        stop_at_sql_block: bool = False,
+        seed: Optional[int] = None
+    ) -> str:
+        """
+        Run a single completion without blocking the event loop; see _invoke.
+        A seed makes concurrent samples of the same prompt differ reproducibly.
+        """
+        options = {
+            'temperature': settings.llm_temperature,
+            'num_predict': settings.llm_max_tokens
+        }
+        if seed is not None:
+            options['seed'] = seed
+        stream = await self._get_async_client().generate(
+            model=settings.llm_model_name,
+            prompt=prompt,
+            stream=True,
+            options=options
+        )
+        parts = []
+        async for chunk in stream:
+            parts.append(chunk['response'])
+            if stop_at_sql_block and self._sql_block_closed(parts):
+                await stream.aclose()
+                break
+        return ''.join(parts)
+    
     def generate_sql(
         self, 
         prompt: str, 
         schema_context: str,
         business_context: Optional[str] = None,
-        few_shot_examples: Optional[str] = None
+        few_shot_examples: Optional[str] = None,
+        cache_key: Optional[str] = None,
+        cache_embedding: Optional[np.ndarray] = None
     ) -> str:
         """
         Generate SQL from natural language query.
         
+        The SQL cache is only read here; callers store SQL that passed
+        validation with cache_sql.
+        
         Args:
             prompt: User's natural language query
             schema_context: Retrieved schema information
             business_context: Optional business rules and definitions
             few_shot_examples: Optional few-shot examples
+            cache_key: Question used for the SQL cache lookup (defaults to prompt)
+            cache_embedding: Precomputed embedding of cache_key (optional)
             
         Returns:
             Generated SQL query
         """
+        cache_key = cache_key or prompt
+        cached_sql = self._get_cached_sql(cache_key, schema_context, business_context, cache_embedding)
+        if cached_sql is not None:
+            return cached_sql
+        
         # Build the complete prompt
         complete_prompt = self._build_sql_generation_prompt(
             prompt, schema_context, business_context, few_shot_examples
@@ -57,13 +230,68 @@ class LLMManager:
         
         # Generate SQL
         try:
-            result = self.llm.invoke(complete_prompt)
+            result = self._invoke(complete_prompt, stop_at_sql_block=True)
             sql = self._extract_sql_from_response(result)
             self.logger.info(f"Generated SQL: {sql}")
-            return sql
         except Exception as e:
             self.logger.error(f"Error generating SQL: {e}")
             raise
+        
+        return sql
+    
+    def cache_sql(
+        self,
+        cache_key: str,
+        sql: str,
+        schema_context: str,
+        business_context: Optional[str] = None,
+        cache_embedding: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        Store SQL that passed validation for similar questions over the same context.
+        
+        Args:
+            cache_key: Question the SQL answers
+            sql: Validated SQL
+            schema_context: Schema information it was generated from
+            business_context: Business rules it was generated with
+            cache_embedding: Precomputed embedding of cache_key (optional)
+        """
+        if self.sql_cache is None:
+            return
+        
+        self.sql_cache.put(cache_key, {
+            'sql': sql,
+            'context': (schema_context, business_context)
+        }, embedding=cache_embedding)
+    
+    def _get_cached_sql(
+        self,
+        cache_key: str,
+        schema_context: str,
+        business_context: Optional[str],
+        cache_embedding: Optional[np.ndarray] = None
+    ) -> Optional[str]:
+        """Return SQL cached for a similar question over the same context."""
+        if self.sql_cache is None:
+            return None
+        
+        cached = self.sql_cache.get(cache_key, embedding=cache_embedding)
+        # A similar question over different tables needs different SQL
+        if cached is None or cached['context'] != (schema_context, business_context):
+            return None
+        
+        self.logger.info(f"Using cached SQL: {cached['sql']}")
+        return cached['sql']
+    
+    def clear_prompt_cache(self) -> None:
+        """Drop all memoized generation prompts."""
+        _build_prompt_cached.cache_clear()
+    
+    def clear_sql_cache(self) -> None:
+        """Drop all cached generated SQL."""
+        if self.sql_cache is not None:
+            self.sql_cache.clear()
     
     def correct_sql(
         self, 
@@ -84,27 +312,55 @@ class LLMManager:
         Returns:
             Corrected SQL query
         """
-        correction_prompt = f"""
-        你上次生成的SQL执行时出错了。请根据下面的错误信息修正你的SQL。
-        
-        原始问题: {original_prompt}
-        
-        错误的SQL: 
-        ```sql
-        {error_sql}
-        ```
-        
-        数据库报错: {error_message}
-        
-        请重新生成正确的SQL，只返回SQL代码，不要包含其他解释。
-        """
+        complete_prompt = self._build_correction_prompt(
+            original_prompt, error_sql, error_message, schema_context
+        )
         
+        try:
+            result = self._invoke(complete_prompt, stop_at_sql_block=True)
+            corrected_sql = self._extract_sql_from_response(result)
+            self.logger.info(f"Corrected SQL: {corrected_sql}")
+            return corrected_sql
+        except Exception as e:
+            self.logger.error(f"Error correcting SQL: {e}")
+            raise
+    
+    async def agenerate_sql(
+        self, 
+        prompt: str, 
+        schema_context: str,
+        business_context: Optional[str] = None,
+        few_shot_examples: Optional[str] = None
+    ) -> str:
+        """Async variant of generate_sql."""
         complete_prompt = self._build_sql_generation_prompt(
-            correction_prompt, schema_context
+            prompt, schema_context, business_context, few_shot_examples
         )
         
         try:
-            result = self.llm.invoke(complete_prompt)
+            result = await self._ainvoke(complete_prompt, stop_at_sql_block=True)
+            sql = self._extract_sql_from_response(result)
+            self.logger.info(f"Generated SQL: {sql}")
+            return sql
+        except Exception as e:
+            self.logger.error(f"Error generating SQL: {e}")
+            raise
+    
+    async def acorrect_sql(
+        self, 
+        original_prompt: str, 
+        error_sql: str, 
+        error_message: str,
+        schema_context: str,
+        seed: Optional[int] = None
+    ) -> str:
+        """Async variant of correct_sql; seed is passed to the model."""
+        complete_prompt = self._build_correction_prompt(
+            original_prompt, error_sql, error_message, schema_context
+        )
+        
+        try:
+            result = await self._ainvoke(complete_prompt, stop_at_sql_block=True, seed=seed)
             corrected_sql = self._extract_sql_from_response(result)
             self.logger.info(f"Corrected SQL: {corrected_sql}")
             return corrected_sql
@@ -112,64 +368,199 @@ class LLMManager:
             self.logger.error(f"Error correcting SQL: {e}")
             raise
     
-    def _build_sql_generation_prompt(
+    async def abatch_generate_sql(
         self,
-        prompt: str,
+        prompts: List[str],
         schema_context: str,
         business_context: Optional[str] = None,
         few_shot_examples: Optional[str] = None
-    ) -> str:
-        """Build the complete prompt for SQL generation."""
-        template = f"""
-        你是一个世界级的数据库专家和SQL工程师。你的任务是根据用户的问题和提供的数据表结构，生成一段准确、高效的SQL查询。
+    ) -> List[str]:
+        """
+        Generate SQL for several questions concurrently.
         
-        请严格遵循以下规则：
-        1. 只使用提供的表和字段。
-        2. 注意表之间的关联关系。
-        3. 如果问题的计算逻辑复杂，请使用CTE（WITH语句）来保证SQL的可读性。
-        4. 不要编造任何不存在的字段。
-        5. 返回的SQL必须语法正确且可执行。
+        Throughput is bounded by the server's OLLAMA_NUM_PARALLEL.
         
-        数据表结构：
-        {schema_context}
+        Args:
+            prompts: User questions
+            schema_context: Schema information shared by all questions
+            business_context: Optional business rules and definitions
+            few_shot_examples: Optional few-shot examples
+            
+        Returns:
+            Generated SQL for each question, in order
+        """
+        return list(await asyncio.gather(*[
+            self.agenerate_sql(prompt, schema_context, business_context, few_shot_examples)
+            for prompt in prompts
+        ]))
+    
+    async def abatch_generate_binned(
+        self,
+        prompts: List[str],
+        schema_context: str,
+        business_context: Optional[str] = None,
+        few_shot_examples: Optional[str] = None
+    ) -> List[str]:
+        """
+        Generate SQL for many questions in bins of similar expected length.
         
-        {business_context or ''}
+        Questions are ordered by a cheap output-length estimate and sent in
+        bins of settings.llm_batch_size concurrent requests, one bin at a
+        time, so short queries don't sit idle behind a long one.
         
-        {few_shot_examples or ''}
+        Args:
+            prompts: User questions
+            schema_context: Schema information shared by all questions
+            business_context: Optional business rules and definitions
+            few_shot_examples: Optional few-shot examples
+            
+        Returns:
+            Generated SQL for each question, in the original order
+        """
+        order = sorted(range(len(prompts)), key=lambda i: self._estimate_sql_length(prompts[i]))
+        bin_size = max(1, settings.llm_batch_size)
+        results: List[Optional[str]] = [None] * len(prompts)
         
-        现在，请根据以上信息，为以下问题生成SQL：
-        "{prompt}"
+        for start in range(0, len(order), bin_size):
+            indices = order[start:start + bin_size]
+            sqls = await asyncio.gather(*[
+                self.agenerate_sql(prompts[i], schema_context, business_context, few_shot_examples)
+                for i in indices
+            ])
+            for i, sql in zip(indices, sqls):
+                results[i] = sql
         
-        请将SQL代码包裹在```sql ... ```中。
+        return results
+    
+    def _estimate_sql_length(self, prompt: str) -> int:
+        """Rough relative size of the SQL a question will need."""
+        lowered = prompt.lower()
+        return len(prompt) + 50 * sum(hint in lowered for hint in _LONG_SQL_HINTS)
+    
+    def generate_sql_batch(
+        self,
+        prompts: List[str],
+        schema_context: str,
+        business_context: Optional[str] = None,
+        few_shot_examples: Optional[str] = None
+    ) -> List[str]:
         """
+        Generate SQL for several questions that share one schema context.
+        
+        Questions are packed into as few prompts as the output budget allows,
+        so the (large) schema context is only sent once per group.
         
-        return template.strip()
+        Args:
+            prompts: User questions
+            schema_context: Schema information shared by all questions
+            business_context: Optional business rules and definitions
+            few_shot_examples: Optional few-shot examples
+            
+        Returns:
+            Generated SQL for each question, in order
+        """
+        group_size = max(1, settings.llm_max_tokens // BATCH_TOKENS_PER_SQL)
+        results: List[str] = []
+        
+        for start in range(0, len(prompts), group_size):
+            group = prompts[start:start + group_size]
+            if len(group) == 1:
+                results.append(self.generate_sql(
+                    group[0], schema_context, business_context, few_shot_examples
+                ))
+                continue
+            
+            questions = '\n'.join(
+                f"问题 {i}: {question}" for i, question in enumerate(group, 1)
+            )
+            batch_prompt = (
+                f"{questions}\n\n"
+                f"请依次为以上 {len(group)} 个问题分别生成SQL，"
+                f"第 i 个问题的SQL包裹在```sql [i] ... ```中。"
+            )
+            complete_prompt = self._build_sql_generation_prompt(
+                batch_prompt, schema_context, business_context, few_shot_examples
+            )
+            
+            try:
+                result = self._invoke(complete_prompt)
+            except Exception as e:
+                self.logger.error(f"Error generating SQL batch: {e}")
+                raise
+            
+            sqls = self._extract_batch_sql_from_response(result, len(group))
+            for question, sql in zip(group, sqls):
+                # Fall back to a single call for anything the model skipped
+                if sql is None:
+                    sql = self.generate_sql(
+                        question, schema_context, business_context, few_shot_examples
+                    )
+                results.append(sql)
+        
+        self.logger.info(f"Generated SQL for {len(prompts)} questions in batch")
+        return results
+    
+    def _build_correction_prompt(
+        self,
+        original_prompt: str,
+        error_sql: str,
+        error_message: str,
+        schema_context: str
+    ) -> str:
+        """Build the complete prompt for SQL correction."""
+        correction_prompt = f"""
+        你上次生成的SQL执行时出错了。请根据下面的错误信息修正你的SQL。
+        
+        原始问题: {original_prompt}
+        
+        错误的SQL: 
+        ```sql
+        {error_sql}
+        ```
+        
+        数据库报错: {error_message}
+        
+        请重新生成正确的SQL，只返回SQL代码，不要包含其他解释。
+        """
+        
+        return self._build_sql_generation_prompt(correction_prompt, schema_context)
+    
+    def _build_sql_generation_prompt(
+        self,
+        prompt: str,
+        schema_context: str,
+        business_context: Optional[str] = None,
+        few_shot_examples: Optional[str] = None
+    ) -> str:
+        """Build the complete prompt for SQL generation."""
+        return _build_prompt_cached(
+            prompt, schema_context, business_context, few_shot_examples
+        )
     
     def _extract_sql_from_response(self, response: str) -> str:
         """Extract SQL code from LLM response."""
-        import re
-        
         # Try to extract SQL from code blocks
-        sql_pattern = r"```sql\s*(.*?)\s*```"
-        matches = re.findall(sql_pattern, response, re.DOTALL)
+        match = _SQL_BLOCK_RE.search(response)
         
-        if matches:
-            return matches[0].strip()
+        if match:
+            return match.group(1).strip()
         
-        # If no code blocks, try to find SQL-like content
+        # If no code blocks, take everything from the first SQL-like line on
         lines = response.split('\n')
-        sql_lines = []
-        in_sql = False
+        for start, line in enumerate(lines):
+            if _SQL_START_RE.match(line.strip()):
+                return '\n'.join(rest.strip() for rest in lines[start:])
         
-        for line in lines:
-            line = line.strip()
-            if line.upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
-                in_sql = True
-            if in_sql:
-                sql_lines.append(line)
+        # Fallback: return the whole response
+        return response.strip()
+    
+    def _extract_batch_sql_from_response(self, response: str, count: int) -> List[Optional[str]]:
+        """Extract numbered ```sql [i]``` blocks; missing entries are None."""
+        sqls: List[Optional[str]] = [None] * count
         
-        if sql_lines:
-            return '\n'.join(sql_lines)
+        for index, sql in _SQL_BATCH_BLOCK_RE.findall(response):
+            position = int(index) - 1
+            if 0 <= position < count and sqls[position] is None:
+                sqls[position] = sql.strip()
         
-        # Fallback: return the whole response
-        return response.strip()
\ No newline at end of file
+        return sqls
\ No newline at end of file
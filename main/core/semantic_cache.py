@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from .embedding import EmbeddingManager
+from ..config import settings
+
+
+class SemanticCache:
+    """Caches query results keyed by the semantic similarity of the query."""
+
+    def __init__(
+        self,
+        embedding_manager: EmbeddingManager,
+        threshold: float = None,
+        max_size: int = None,
+        ttl: int = None
+    ):
+        """
+        Initialize the semantic cache.
+
+        Args:
+            embedding_manager: Embedding manager used to embed queries
+            threshold: Minimum cosine similarity for a cache hit
+            max_size: Maximum number of cached entries (LRU eviction)
+            ttl: Entry lifetime in seconds
+        """
+        self.logger = logging.getLogger(__name__)
+        self.embedding_manager = embedding_manager
+        self.threshold = threshold if threshold is not None else settings.semantic_cache_threshold
+        self.max_size = max_size if max_size is not None else settings.semantic_cache_max_size
+        self.ttl = ttl if ttl is not None else settings.semantic_cache_ttl
+
+        # query -> (embedding, value, stored_at), oldest first
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list = []
+        self._stored_at: Optional[np.ndarray] = None  # per matrix row
+        self._lock = threading.Lock()
+
+        # (query, embedding) computed by the last miss, reused by the following put()
+        self._last: tuple = (None, None)
+
+    def get(self, query: str, embedding: np.ndarray = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached value for a semantically similar query.
+
+        Args:
+            query: Natural language query
+            embedding: Precomputed query embedding (optional)
+
+        Returns:
+            Cached value or None on a miss
+        """
+        # Exact repeats skip the embedding model entirely
+        hit = self.get_exact(query)
+        if hit is not None:
+            return hit
+
+        if embedding is None:
+            embedding = self.embedding_manager.embed_query(query)
+        self._last = (query, embedding)
+
+        with self._lock:
+            if not self._entries:
+                return None
+
+            matrix = self._get_matrix()
+            scores = matrix @ embedding
+            if self.ttl:
+                # Expired rows must not win over a live match
+                scores[time.monotonic() - self._stored_at > self.ttl] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._get_entry(self._keys[best])
+
+    def get_exact(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a value cached for exactly this query, without embedding it.
+
+        Args:
+            query: Natural language query
+
+        Returns:
+            Cached value or None on a miss
+        """
+        with self._lock:
+            return self._get_entry(query)
+
+    def put(self, query: str, value: Dict[str, Any], embedding: np.ndarray = None) -> None:
+        """
+        Store a value for a query.
+
+        Args:
+            query: Natural language query
+            value: Value to cache
+            embedding: Precomputed query embedding (optional)
+        """
+        if embedding is None:
+            last_query, last_embedding = self._last
+            if query == last_query:
+                embedding = last_embedding
+            else:
+                embedding = self.embedding_manager.embed_query(query)
+
+        with self._lock:
+            if query in self._entries:
+                self._entries.move_to_end(query)
+            self._entries[query] = (embedding, value, time.monotonic())
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+            self._matrix = None
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._keys = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a live entry's value, expiring it if its TTL has passed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        _, value, stored_at = entry
+        if self.ttl and time.monotonic() - stored_at > self.ttl:
+            self._entries.pop(key, None)
+            self._matrix = None
+            return None
+
+        self._entries.move_to_end(key)
+        self.logger.debug(f"Semantic cache hit for query: {key[:50]}")
+        return value
+
+    def _get_matrix(self) -> np.ndarray:
+        """Stack cached embeddings into a matrix, rebuilding only after changes."""
+        if self._matrix is None:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.stack([entry[0] for entry in self._entries.values()])
+            self._stored_at = np.array([entry[2] for entry in self._entries.values()])
+        return self._matrix
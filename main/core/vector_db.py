@@ -1,11 +1,41 @@
 import logging
-from typing import List, Dict, Any, Optional
+import os
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from chromadb.utils import embedding_functions
+import numpy as np
 
 from ..config import settings
 
+# Distinct query texts whose embeddings are kept per VectorDBManager
+QUERY_EMBEDDING_CACHE_SIZE = 1000
+
+# Documents fetched per page when iterating the whole collection
+DOCUMENT_PAGE_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def _get_embedding_function(providers: Tuple[str, ...]):
+    """
+    Create the ONNX MiniLM embedder once per process for each provider list,
+    so every VectorDBManager shares one loaded model.
+    """
+    # Same model as Chroma's default, so existing collections stay valid;
+    # pinning providers skips onnxruntime's probing of every installed one
+    return embedding_functions.ONNXMiniLM_L6_V2(preferred_providers=list(providers) or None)
+
+
+def _chroma_embeddings(embeddings: Optional[np.ndarray]) -> Optional[List[List[float]]]:
+    """
+    Embeddings as chromadb 0.4 accepts them: its validation rejects arrays,
+    so matrices are converted to nested lists (in C, via tolist) at the call.
+    """
+    if isinstance(embeddings, np.ndarray):
+        return embeddings.tolist()
+    return embeddings
+
 
 class VectorDBManager:
     """Manages vector database operations for storing and retrieving schema information."""
@@ -14,7 +44,11 @@ class VectorDBManager:
         """Initialize the vector database manager."""
         self.logger = logging.getLogger(__name__)
         self.client = self._initialize_client()
+        # Explicit so queries can be embedded (and cached) with the same
+        # function the collection uses for documents
+        self.embedding_function = self._initialize_embedding_function()
         self.collection = self._get_or_create_collection()
+        self._embed_query = lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)(self._compute_query_embedding)
         
     def _initialize_client(self) -> chromadb.Client:
         """Initialize ChromaDB client."""
@@ -23,7 +57,7 @@ class VectorDBManager:
                 path=settings.vector_db_path,
                 settings=ChromaSettings(
                     anonymized_telemetry=False,
-                    allow_reset=True
+                    allow_reset=settings.vector_db_allow_reset
                 )
             )
             self.logger.info(f"ChromaDB client initialized at: {settings.vector_db_path}")
@@ -32,14 +66,30 @@ class VectorDBManager:
             self.logger.error(f"Failed to initialize ChromaDB: {e}")
             raise
     
+    def _initialize_embedding_function(self):
+        """Get the process-wide ONNX MiniLM embedder for the configured providers."""
+        providers = tuple(
+            provider.strip()
+            for provider in settings.vector_db_onnx_providers.split(',')
+            if provider.strip()
+        )
+        return _get_embedding_function(providers)
+    
     def _get_or_create_collection(self):
         """Get or create the collection for storing schema information."""
         try:
             collection = self.client.get_or_create_collection(
                 name=settings.vector_db_collection_name,
+                embedding_function=self.embedding_function,
                 metadata={
                     "description": "Text2SQL knowledge base with database schemas",
-                    "created_by": "text2sql"
+                    "created_by": "text2sql",
+                    # Index parameters are fixed at creation; changing the
+                    # space or M requires deleting and rebuilding the collection
+                    "hnsw:space": settings.vector_db_hnsw_space,
+                    "hnsw:construction_ef": settings.vector_db_hnsw_construction_ef,
+                    "hnsw:search_ef": settings.vector_db_hnsw_search_ef,
+                    "hnsw:M": settings.vector_db_hnsw_m
                 }
             )
             self.logger.info(f"Collection ready: {settings.vector_db_collection_name}")
@@ -52,7 +102,8 @@ class VectorDBManager:
         self, 
         documents: List[str], 
         metadatas: List[Dict[str, Any]],
-        ids: List[str]
+        ids: List[str],
+        embeddings: Optional[np.ndarray] = None
     ) -> None:
         """
         Add documents to the vector database.
@@ -61,18 +112,137 @@ class VectorDBManager:
             documents: List of document texts
             metadatas: List of metadata dictionaries
             ids: List of unique document IDs
+            embeddings: Precomputed embeddings (see embed_documents); computed
+                by the collection when omitted
         """
         try:
+            self.set_build_hash(None)
             self.collection.add(
                 documents=documents,
                 metadatas=metadatas,
-                ids=ids
+                ids=ids,
+                embeddings=_chroma_embeddings(embeddings)
             )
-            self.logger.info(f"Added {len(documents)} documents to vector DB")
+            self.logger.debug(f"Added {len(documents)} documents to vector DB")
         except Exception as e:
             self.logger.error(f"Error adding documents: {e}")
             raise
     
+    def upsert_batch(
+        self,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str],
+        embeddings: Optional[np.ndarray] = None,
+        batch_size: int = 256
+    ) -> None:
+        """
+        Insert or replace documents, in batches.
+        
+        Args:
+            documents: List of document texts
+            metadatas: List of metadata dictionaries
+            ids: List of unique document IDs
+            embeddings: Precomputed embeddings (see embed_documents); computed
+                by the collection when omitted
+            batch_size: Documents per upsert call
+        """
+        try:
+            self.set_build_hash(None)
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                self.collection.upsert(
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end],
+                    ids=ids[start:end],
+                    embeddings=_chroma_embeddings(embeddings[start:end] if embeddings is not None else None)
+                )
+            self.logger.info(f"Upserted {len(ids)} documents to vector DB")
+        except Exception as e:
+            self.logger.error(f"Error upserting documents: {e}")
+            raise
+    
+    def embed_documents(self, documents: List[str], batch_size: int = None) -> np.ndarray:
+        """
+        Embed documents with the collection's embedding function, in batches.
+        
+        Args:
+            documents: List of document texts
+            batch_size: Documents per embedding call
+            
+        Returns:
+            Float32 matrix with one row per document
+        """
+        if batch_size is None:
+            batch_size = settings.embedding_batch_size
+        
+        batches = [
+            np.asarray(self.embedding_function(documents[start:start + batch_size]), dtype=np.float32)
+            for start in range(0, len(documents), batch_size)
+        ]
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(batches)
+    
+    def get_content_hashes(self) -> Dict[str, Optional[str]]:
+        """
+        Get the stored content hash of every document.
+        
+        Returns:
+            Mapping of document ID to its 'content_hash' metadata (None if unset)
+        """
+        try:
+            results = self.collection.get(include=['metadatas'])
+            return {
+                doc_id: (metadata or {}).get('content_hash')
+                for doc_id, metadata in zip(results['ids'], results['metadatas'])
+            }
+        except Exception as e:
+            self.logger.error(f"Error reading content hashes: {e}")
+            raise
+    
+    def get_build_hash(self) -> Optional[str]:
+        """
+        Get the hash of the chunk set the collection was last built from.
+        
+        Returns:
+            The hash, or None if unknown or the collection changed since
+        """
+        try:
+            with open(self._build_hash_path(), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def set_build_hash(self, build_hash: Optional[str]) -> None:
+        """
+        Record the hash of the chunk set the collection now holds.
+        
+        Every write clears it, so a stored hash always describes the
+        collection's current contents.
+        
+        Args:
+            build_hash: Hash to record, or None to forget it
+        """
+        path = self._build_hash_path()
+        if build_hash is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(build_hash)
+    
+    def _build_hash_path(self) -> str:
+        """Sidecar file holding the build hash, next to the Chroma data."""
+        # Kept outside collection metadata: Chroma's modify() replaces the
+        # whole metadata dict and rejects hnsw:* keys
+        return os.path.join(
+            settings.vector_db_path,
+            f"{settings.vector_db_collection_name}.build_hash"
+        )
+    
     def search(
         self, 
         query: str, 
@@ -97,28 +267,97 @@ class VectorDBManager:
                 top_k = settings.rag_top_k
             
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[list(self._embed_query(query))],
+                n_results=top_k,
+                where=where,
+                where_document=where_document
+            )
+            
+            # Format results
+            formatted_results = [
+                {'document': document, 'metadata': metadata, 'distance': distance, 'id': doc_id}
+                for document, metadata, distance, doc_id in zip(
+                    results['documents'][0],
+                    results['metadatas'][0],
+                    results['distances'][0],
+                    results['ids'][0]
+                )
+            ]
+            
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(f"Found {len(formatted_results)} results for query: {query[:50]}...")
+            return formatted_results
+        except Exception as e:
+            self.logger.error(f"Error searching documents: {e}")
+            raise
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one index lookup.
+        
+        Args:
+            queries: Search query texts
+            top_k: Number of results to return per query
+            where: Metadata filter conditions, shared by all queries
+            where_document: Document content filter conditions
+            
+        Returns:
+            One list of search results per query, in query order
+        """
+        if not queries:
+            return []
+        
+        try:
+            if top_k is None:
+                top_k = settings.rag_top_k
+            
+            results = self.collection.query(
+                query_embeddings=[list(self._embed_query(query)) for query in queries],
                 n_results=top_k,
                 where=where,
                 where_document=where_document
             )
             
             # Format results
-            formatted_results = []
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i],
-                    'id': results['ids'][0][i]
-                })
-            
-            self.logger.info(f"Found {len(formatted_results)} results for query: {query[:50]}...")
+            formatted_results = [
+                [
+                    {'document': document, 'metadata': metadata, 'distance': distance, 'id': doc_id}
+                    for document, metadata, distance, doc_id in zip(documents, metadatas, distances, ids)
+                ]
+                for documents, metadatas, distances, ids in zip(
+                    results['documents'],
+                    results['metadatas'],
+                    results['distances'],
+                    results['ids']
+                )
+            ]
+            
+            self.logger.debug(f"Searched {len(queries)} queries in one batch")
             return formatted_results
         except Exception as e:
             self.logger.error(f"Error searching documents: {e}")
             raise
     
+    def _compute_query_embedding(self, query: str) -> tuple:
+        """Embed a query text; wrapped in a per-instance LRU cache."""
+        return tuple(float(value) for value in self.embedding_function([query])[0])
+    
+    def query_cache_stats(self) -> Dict[str, int]:
+        """
+        Get query embedding cache statistics.
+        
+        Returns:
+            Hits, misses and current size of the cache
+        """
+        info = self._embed_query.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
+    
     def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve a specific document by ID.
@@ -146,6 +385,35 @@ class VectorDBManager:
             self.logger.error(f"Error retrieving document: {e}")
             return None
     
+    def get_documents(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve several documents by ID in one lookup.
+        
+        Args:
+            doc_ids: Document IDs
+            
+        Returns:
+            Document data by ID; IDs not found are left out
+        """
+        if not doc_ids:
+            return {}
+        
+        try:
+            results = self.collection.get(
+                ids=doc_ids,
+                include=['documents', 'metadatas']
+            )
+            
+            return {
+                doc_id: {'document': document, 'metadata': metadata, 'id': doc_id}
+                for doc_id, document, metadata in zip(
+                    results['ids'], results['documents'], results['metadatas']
+                )
+            }
+        except Exception as e:
+            self.logger.error(f"Error retrieving documents: {e}")
+            return {}
+    
     def update_document(
         self, 
         doc_id: str, 
@@ -169,8 +437,9 @@ class VectorDBManager:
             if metadata is not None:
                 update_kwargs["metadatas"] = [metadata]
             
+            self.set_build_hash(None)
             self.collection.update(**update_kwargs)
-            self.logger.info(f"Updated document: {doc_id}")
+            self.logger.debug(f"Updated document: {doc_id}")
         except Exception as e:
             self.logger.error(f"Error updating document: {e}")
             raise
@@ -183,12 +452,59 @@ class VectorDBManager:
             doc_id: Document ID to delete
         """
         try:
+            self.set_build_hash(None)
             self.collection.delete(ids=[doc_id])
-            self.logger.info(f"Deleted document: {doc_id}")
+            self.logger.debug(f"Deleted document: {doc_id}")
         except Exception as e:
             self.logger.error(f"Error deleting document: {e}")
             raise
     
+    def delete_documents(self, doc_ids: List[str]) -> None:
+        """
+        Delete several documents by ID.
+        
+        Args:
+            doc_ids: Document IDs to delete
+        """
+        try:
+            self.set_build_hash(None)
+            self.collection.delete(ids=doc_ids)
+            self.logger.info(f"Deleted {len(doc_ids)} documents")
+        except Exception as e:
+            self.logger.error(f"Error deleting documents: {e}")
+            raise
+    
+    def iter_documents(self, page_size: int = DOCUMENT_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over every document in the collection, a page at a time.
+        
+        Args:
+            page_size: Documents fetched per request
+            
+        Yields:
+            Document data with 'document', 'metadata' and 'id'
+        """
+        offset = 0
+        while True:
+            try:
+                results = self.collection.get(
+                    limit=page_size,
+                    offset=offset,
+                    include=['documents', 'metadatas']
+                )
+            except Exception as e:
+                self.logger.error(f"Error iterating documents: {e}")
+                raise
+            
+            for doc_id, document, metadata in zip(
+                results['ids'], results['documents'], results['metadatas']
+            ):
+                yield {'document': document, 'metadata': metadata, 'id': doc_id}
+            
+            if len(results['ids']) < page_size:
+                return
+            offset += page_size
+    
     def list_documents(self, limit: int = 100) -> List[Dict[str, Any]]:
         """
         List all documents in the collection.
@@ -205,14 +521,10 @@ class VectorDBManager:
                 include=['metadatas']
             )
             
-            documents = []
-            for i in range(len(results['ids'])):
-                documents.append({
-                    'id': results['ids'][i],
-                    'metadata': results['metadatas'][i]
-                })
-            
-            return documents
+            return [
+                {'id': doc_id, 'metadata': metadata}
+                for doc_id, metadata in zip(results['ids'], results['metadatas'])
+            ]
         except Exception as e:
             self.logger.error(f"Error listing documents: {e}")
             return []
@@ -233,6 +545,7 @@ class VectorDBManager:
     def clear_collection(self) -> None:
         """Clear all documents from the collection."""
         try:
+            self.set_build_hash(None)
             # Delete and recreate collection
             self.client.delete_collection(settings.vector_db_collection_name)
             self.collection = self._get_or_create_collection()
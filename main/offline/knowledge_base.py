@@ -1,12 +1,47 @@
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple
+import hashlib
 import json
+import os
+import queue
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
 from .metadata_sync import MetadataSync
 from ..core import VectorDBManager, EmbeddingManager
 
+# Chunks per vector DB insert while building from a live database
+STORE_BATCH_SIZE = 128
+
+# Tables reflected ahead of chunk creation before the producer blocks
+PIPELINE_QUEUE_SIZE = 256
+
+# Heuristic synonyms: table-name keyword -> synonyms
+_TABLE_SYNONYMS = {
+    'order': ('订单', '交易记录'),
+    'user': ('用户', '客户'),
+    'product': ('产品', '商品'),
+}
+
+# Heuristic synonyms: (column-name keywords, synonyms), in output order
+_COLUMN_SYNONYMS = (
+    (('amount', 'price'), ('金额', '价格', '销售额')),
+    (('time', 'date', 'at'), ('时间', '日期')),
+    (('status',), ('状态', '情况')),
+)
+_ID_SYNONYMS = ('ID', '编号')
+
+# Tables needed before chunk creation is spread over worker processes;
+# below this, process start-up costs more than it saves
+PARALLEL_CHUNK_MIN_TABLES = 256
+
+_END_OF_TABLES = object()
+
+# Enum values documented in column comments, e.g. "1=成功, 2=失败"
+_ENUM_RE = re.compile(r'(\d+)\s*=\s*([^,\s]+)')
+
 
 class KnowledgeBaseBuilder:
     """Builds and manages the knowledge base for RAG."""
@@ -31,17 +66,13 @@ class KnowledgeBaseBuilder:
             business_rules: Optional business rules and definitions
         """
         try:
-            # Extract metadata
+            # Reflect tables, build chunks and store them as overlapping stages
             self.metadata_sync.connect(database_url)
-            metadata = self.metadata_sync.extract_metadata()
-            
-            # Process into chunks
-            chunks = self._create_chunks(metadata, business_rules)
+            chunk_count = self._build_pipelined(
+                self.metadata_sync.iter_tables(), business_rules
+            )
             
-            # Generate embeddings and store
-            self._store_chunks(chunks)
-            
-            self.logger.info(f"Knowledge base built with {len(chunks)} chunks")
+            self.logger.info(f"Knowledge base built with {chunk_count} chunks")
             
         except Exception as e:
             self.logger.error(f"Error building knowledge base: {e}")
@@ -75,6 +106,103 @@ class KnowledgeBaseBuilder:
             self.logger.error(f"Error building knowledge base from file: {e}")
             raise
     
+    def _build_pipelined(
+        self,
+        tables: Iterator[Tuple[str, Dict[str, Any]]],
+        business_rules: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Build the knowledge base with metadata reflection, chunk creation and
+        vector DB inserts running concurrently.
+        
+        A producer thread reflects tables into a bounded queue, this thread
+        turns them into chunks, and batches are inserted on a writer thread
+        while the next batch is assembled.
+        
+        The chunk-set hash is accumulated as chunks are made and recorded
+        at the end, but unlike _store_chunks it can't short-circuit the
+        build: it is only known once every table has been reflected, while
+        the stored content hashes are needed before the first batch is
+        written. Unchanged chunks are still skipped by content hash.
+        
+        Args:
+            tables: Iterator of (table_name, table_info)
+            business_rules: Business rules and definitions
+            
+        Returns:
+            Number of chunks stored
+        """
+        table_queue: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stop = threading.Event()
+        
+        def put(item) -> bool:
+            # Timed puts so a failed consumer can't leave the producer blocked
+            while not stop.is_set():
+                try:
+                    table_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce() -> None:
+            try:
+                for item in tables:
+                    if not put(item):
+                        return
+            finally:
+                put(_END_OF_TABLES)
+        
+        existing = self.vector_db.get_content_hashes()
+        chunk_hashes: List[Tuple[str, str]] = []
+        created_at = datetime.now().isoformat()
+        
+        chunk_count = 0
+        pending = None
+        batch: List[Dict[str, Any]] = []
+        
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="kb-pipeline") as executor:
+            producer = executor.submit(produce)
+            try:
+                while True:
+                    item = table_queue.get()
+                    if item is _END_OF_TABLES:
+                        break
+                    
+                    table_name, table_info = item
+                    chunk = _create_table_chunk(table_name, table_info, business_rules, created_at)
+                    chunk_hashes.append((chunk['id'], self._hash_chunk(chunk)))
+                    batch.append(chunk)
+                    
+                    if len(batch) >= STORE_BATCH_SIZE:
+                        if pending is not None:
+                            pending.result()
+                        pending = executor.submit(self._upsert_chunks, batch, existing)
+                        chunk_count += len(batch)
+                        batch = []
+                
+                # Surface reflection errors before writing the tail
+                producer.result()
+                
+                if business_rules:
+                    chunk = _create_business_chunk(business_rules, created_at)
+                    chunk_hashes.append((chunk['id'], self._hash_chunk(chunk)))
+                    batch.append(chunk)
+                
+                if pending is not None:
+                    pending.result()
+                if batch:
+                    self._upsert_chunks(batch, existing)
+                    chunk_count += len(batch)
+                
+                self._delete_stale(existing, {chunk_id for chunk_id, _ in chunk_hashes})
+                self.vector_db.set_build_hash(self._build_hash_of(chunk_hashes))
+            except BaseException:
+                stop.set()
+                raise
+        
+        return chunk_count
+    
     def _create_chunks(
         self, 
         metadata: Dict[str, Any],
@@ -90,225 +218,45 @@ class KnowledgeBaseBuilder:
         Returns:
             List of chunk dictionaries
         """
-        chunks = []
+        tables = metadata['tables']
+        created_at = datetime.now().isoformat()
         
-        # Create one chunk per table
-        for table_name, table_info in metadata['tables'].items():
-            chunk = self._create_table_chunk(table_name, table_info, business_rules)
-            chunks.append(chunk)
+        # Create one chunk per table. Chunk creation is pure-Python string
+        # work that holds the GIL, so large schemas use processes, not threads.
+        if len(tables) >= PARALLEL_CHUNK_MIN_TABLES:
+            workers = os.cpu_count() or 1
+            items = [(name, info, business_rules, created_at) for name, info in tables.items()]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunks = list(executor.map(
+                    _create_table_chunk_in_worker,
+                    items,
+                    chunksize=max(1, len(items) // (workers * 4))
+                ))
+        else:
+            chunks = [
+                _create_table_chunk(table_name, table_info, business_rules, created_at)
+                for table_name, table_info in tables.items()
+            ]
         
         # Create chunks for business terms if provided
         if business_rules:
-            business_chunk = self._create_business_chunk(business_rules)
+            business_chunk = _create_business_chunk(business_rules, created_at)
             chunks.append(business_chunk)
         
         return chunks
     
-    def _create_table_chunk(
-        self, 
-        table_name: str, 
-        table_info: Dict[str, Any],
-        business_rules: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """Create a chunk for a single table."""
-        # Generate DDL
-        ddl = self._generate_table_ddl(table_info)
-        
-        # Create document content
-        content = f"""# Table: {table_name}
-
-## Description
-{table_info['comment'] or f'表 {table_name}'}
-
-## Schema
-```sql
-{ddl}
-```
-
-## Columns
-"""
-        
-        # Add column details
-        for col in table_info['columns']:
-            content += f"- **{col['name']}**: {col['type']}"
-            if col['comment']:
-                content += f" - {col['comment']}"
-            if col['is_primary']:
-                content += " (主键)"
-            if col['is_foreign']:
-                content += f" (外键 -> {col['references']['table']}.{col['references']['column']})"
-            content += "\n"
-        
-        # Add business terms if available
-        if business_rules and table_name in business_rules.get('table_terms', {}):
-            content += "\n## Business Terms\n"
-            for term, definition in business_rules['table_terms'][table_name].items():
-                content += f"- **{term}**: {definition}\n"
-        
-        # Add enum values if available
-        enum_values = self._extract_enum_values(table_info)
-        if enum_values:
-            content += "\n## Enum Values\n"
-            for col_name, values in enum_values.items():
-                content += f"- **{col_name}**: {values}\n"
-        
-        # Add synonyms
-        synonyms = self._generate_synonyms(table_name, table_info)
-        if synonyms:
-            content += "\n## Synonyms\n"
-            if synonyms.get('table'):
-                content += f"- Table: {', '.join(synonyms['table'])}\n"
-            if synonyms.get('columns'):
-                content += "- Columns:\n"
-                for col, syns in synonyms['columns'].items():
-                    content += f"  - {col}: {', '.join(syns)}\n"
-        
-        # Create metadata
-        chunk_metadata = {
-            'type': 'table',
-            'table_name': table_name,
-            'columns': [col['name'] for col in table_info['columns']],
-            'primary_keys': [col['name'] for col in table_info['columns'] if col['is_primary']],
-            'foreign_keys': [
-                {
-                    'column': col['name'],
-                    'references': col['references']
-                }
-                for col in table_info['columns'] if col['is_foreign']
-            ],
-            'row_count': table_info['row_count'],
-            'created_at': datetime.now().isoformat()
-        }
-        
-        return {
-            'id': f"table_{table_name}",
-            'content': content,
-            'metadata': chunk_metadata
-        }
-    
-    def _create_business_chunk(self, business_rules: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a chunk for business rules and terms."""
-        content = "# Business Rules and Definitions\n\n"
-        
-        # Add general business terms
-        if 'general_terms' in business_rules:
-            content += "## General Terms\n"
-            for term, definition in business_rules['general_terms'].items():
-                content += f"- **{term}**: {definition}\n"
-            content += "\n"
-        
-        # Add business metrics
-        if 'metrics' in business_rules:
-            content += "## Business Metrics\n"
-            for metric, definition in business_rules['metrics'].items():
-                content += f"- **{metric}**: {definition}\n"
-            content += "\n"
-        
-        # Add calculation rules
-        if 'calculations' in business_rules:
-            content += "## Calculation Rules\n"
-            for rule, formula in business_rules['calculations'].items():
-                content += f"- **{rule}**: {formula}\n"
-        
-        return {
-            'id': 'business_rules',
-            'content': content,
-            'metadata': {
-                'type': 'business',
-                'created_at': datetime.now().isoformat()
-            }
-        }
-    
-    def _generate_table_ddl(self, table_info: Dict[str, Any]) -> str:
-        """Generate DDL for a table."""
-        ddl_parts = [f"CREATE TABLE {table_info['name']} ("]
-        
-        # Add columns
-        column_defs = []
-        for col in table_info['columns']:
-            col_def = f"    {col['name']} {col['type']}"
-            if not col['nullable']:
-                col_def += " NOT NULL"
-            column_defs.append(col_def)
-        
-        # Add primary key
-        pk_columns = [col['name'] for col in table_info['columns'] if col['is_primary']]
-        if pk_columns:
-            column_defs.append(f"    PRIMARY KEY ({', '.join(pk_columns)})")
-        
-        ddl_parts.append(',\n'.join(column_defs))
-        ddl_parts.append(")")
-        
-        return '\n'.join(ddl_parts)
-    
-    def _extract_enum_values(self, table_info: Dict[str, Any]) -> Dict[str, str]:
-        """Extract enum values from column comments."""
-        enum_values = {}
-        
-        for col in table_info['columns']:
-            if col['comment']:
-                # Look for patterns like "status: 1=成功, 2=失败"
-                enum_pattern = r'(\d+)\s*=\s*([^,\s]+)'
-                matches = re.findall(enum_pattern, col['comment'])
-                if matches:
-                    enum_values[col['name']] = ', '.join([f"{m[0]} means '{m[1]}'" for m in matches])
-        
-        return enum_values
-    
-    def _generate_synonyms(self, table_name: str, table_info: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate synonyms for table and columns."""
-        synonyms = {}
-        
-        # Table synonyms (could be enhanced with LLM or dictionary)
-        table_synonyms = []
-        if 'order' in table_name.lower():
-            table_synonyms.extend(['订单', '交易记录'])
-        if 'user' in table_name.lower():
-            table_synonyms.extend(['用户', '客户'])
-        if 'product' in table_name.lower():
-            table_synonyms.extend(['产品', '商品'])
-        
-        if table_synonyms:
-            synonyms['table'] = table_synonyms
-        
-        # Column synonyms
-        column_synonyms = {}
-        for col in table_info['columns']:
-            syns = []
-            col_name = col['name'].lower()
-            
-            if 'amount' in col_name or 'price' in col_name:
-                syns.extend(['金额', '价格', '销售额'])
-            if 'time' in col_name or 'date' in col_name or 'at' in col_name:
-                syns.extend(['时间', '日期'])
-            if 'status' in col_name:
-                syns.extend(['状态', '情况'])
-            if 'id' in col_name and col_name != 'id':
-                syns.extend(['ID', '编号'])
-            
-            if syns:
-                column_synonyms[col['name']] = syns
-        
-        if column_synonyms:
-            synonyms['columns'] = column_synonyms
-        
-        return synonyms
-    
     def _store_chunks(self, chunks: List[Dict[str, Any]]) -> None:
-        """Store chunks in vector database."""
+        """Sync chunks into the vector database, rewriting only changed ones."""
         try:
-            # Prepare data for vector DB
-            documents = [chunk['content'] for chunk in chunks]
-            metadatas = [chunk['metadata'] for chunk in chunks]
-            ids = [chunk['id'] for chunk in chunks]
-            
-            # Clear existing collection if needed
-            if self.vector_db.count_documents() > 0:
-                self.logger.info("Clearing existing knowledge base")
-                self.vector_db.clear_collection()
+            build_hash = self._build_hash(chunks)
+            if self.vector_db.get_build_hash() == build_hash:
+                self.logger.info("Knowledge base unchanged, nothing to store")
+                return
             
-            # Add documents to vector DB
-            self.vector_db.add_documents(documents, metadatas, ids)
+            existing = self.vector_db.get_content_hashes()
+            self._upsert_chunks(chunks, existing)
+            self._delete_stale(existing, {chunk['id'] for chunk in chunks})
+            self.vector_db.set_build_hash(build_hash)
             
             self.logger.info(f"Stored {len(chunks)} chunks in vector database")
             
@@ -316,6 +264,63 @@ class KnowledgeBaseBuilder:
             self.logger.error(f"Error storing chunks: {e}")
             raise
     
+    def _upsert_chunks(
+        self,
+        chunks: List[Dict[str, Any]],
+        existing: Dict[str, Optional[str]]
+    ) -> None:
+        """Upsert the chunks whose content hash differs from the stored one."""
+        changed = [
+            chunk for chunk in chunks
+            if existing.get(chunk['id']) != self._hash_chunk(chunk)
+        ]
+        
+        if not changed:
+            return
+        
+        documents = [chunk['content'] for chunk in changed]
+        self.vector_db.upsert_batch(
+            documents,
+            [chunk['metadata'] for chunk in changed],
+            [chunk['id'] for chunk in changed],
+            embeddings=self.vector_db.embed_documents(documents)
+        )
+    
+    def _delete_stale(self, existing: Dict[str, Optional[str]], seen_ids: set) -> None:
+        """Delete stored chunks that the current build no longer produces."""
+        stale = [doc_id for doc_id in existing if doc_id not in seen_ids]
+        if stale:
+            self.logger.info(f"Removing {len(stale)} stale chunks")
+            self.vector_db.delete_documents(stale)
+    
+    def _build_hash(self, chunks: List[Dict[str, Any]]) -> str:
+        """Hash a whole chunk set, independent of chunk order."""
+        return self._build_hash_of((chunk['id'], self._hash_chunk(chunk)) for chunk in chunks)
+    
+    def _build_hash_of(self, chunk_hashes: Iterable[Tuple[str, str]]) -> str:
+        """Hash a chunk set given as (chunk id, content hash) pairs, in any order."""
+        digest = hashlib.sha256()
+        for chunk_id, content_hash in sorted(chunk_hashes):
+            digest.update(f"{chunk_id}:{content_hash}\n".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _hash_chunk(self, chunk: Dict[str, Any]) -> str:
+        """A chunk's content hash, computed once and kept in its metadata."""
+        content_hash = chunk['metadata'].get('content_hash')
+        if content_hash is None:
+            content_hash = self._content_hash(chunk)
+            chunk['metadata']['content_hash'] = content_hash
+        return content_hash
+    
+    def _content_hash(self, chunk: Dict[str, Any]) -> str:
+        """Hash a chunk's content and metadata, ignoring its timestamp."""
+        metadata = {
+            key: value for key, value in chunk['metadata'].items()
+            if key not in ('created_at', 'content_hash')
+        }
+        payload = chunk['content'] + json.dumps(metadata, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+    
     def add_business_rule(self, rule_name: str, rule_definition: str) -> None:
         """Add a new business rule to the knowledge base."""
         try:
@@ -368,4 +373,210 @@ class KnowledgeBaseBuilder:
             return None
         except Exception as e:
             self.logger.error(f"Error getting table schema: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+def _create_table_chunk(
+    table_name: str, 
+    table_info: Dict[str, Any],
+    business_rules: Optional[Dict[str, Any]] = None,
+    created_at: Optional[str] = None
+) -> Dict[str, Any]:
+    """Create a chunk for a single table; created_at defaults to now."""
+    # Generate DDL
+    ddl = _generate_table_ddl(table_info)
+    
+    # Create document content
+    parts = [f"""# Table: {table_name}
+
+## Description
+{table_info['comment'] or f'表 {table_name}'}
+
+## Schema
+```sql
+{ddl}
+```
+
+## Columns
+"""]
+    
+    # Add column details
+    for col in table_info['columns']:
+        parts.append(f"- **{col['name']}**: {col['type']}")
+        if col['comment']:
+            parts.append(f" - {col['comment']}")
+        if col['is_primary']:
+            parts.append(" (主键)")
+        if col['is_foreign']:
+            parts.append(f" (外键 -> {col['references']['table']}.{col['references']['column']})")
+        parts.append("\n")
+    
+    # Add business terms if available
+    if business_rules and table_name in business_rules.get('table_terms', {}):
+        parts.append("\n## Business Terms\n")
+        for term, definition in business_rules['table_terms'][table_name].items():
+            parts.append(f"- **{term}**: {definition}\n")
+    
+    # Add enum values if available
+    enum_values = _extract_enum_values(table_info)
+    if enum_values:
+        parts.append("\n## Enum Values\n")
+        for col_name, values in enum_values.items():
+            parts.append(f"- **{col_name}**: {values}\n")
+    
+    # Add synonyms
+    synonyms = _generate_synonyms(table_name, table_info)
+    if synonyms:
+        parts.append("\n## Synonyms\n")
+        if synonyms.get('table'):
+            parts.append(f"- Table: {', '.join(synonyms['table'])}\n")
+        if synonyms.get('columns'):
+            parts.append("- Columns:\n")
+            for col, syns in synonyms['columns'].items():
+                parts.append(f"  - {col}: {', '.join(syns)}\n")
+    
+    content = ''.join(parts)
+    
+    # Create metadata
+    chunk_metadata = {
+        'type': 'table',
+        'table_name': table_name,
+        'columns': [col['name'] for col in table_info['columns']],
+        'primary_keys': [col['name'] for col in table_info['columns'] if col['is_primary']],
+        'foreign_keys': [
+            {
+                'column': col['name'],
+                'references': col['references']
+            }
+            for col in table_info['columns'] if col['is_foreign']
+        ],
+        'row_count': table_info['row_count'],
+        'created_at': created_at or datetime.now().isoformat()
+    }
+    
+    return {
+        'id': f"table_{table_name}",
+        'content': content,
+        'metadata': chunk_metadata
+    }
+
+
+def _create_business_chunk(
+    business_rules: Dict[str, Any],
+    created_at: Optional[str] = None
+) -> Dict[str, Any]:
+    """Create a chunk for business rules and terms; created_at defaults to now."""
+    parts = ["# Business Rules and Definitions\n\n"]
+    
+    # Add general business terms
+    if 'general_terms' in business_rules:
+        parts.append("## General Terms\n")
+        for term, definition in business_rules['general_terms'].items():
+            parts.append(f"- **{term}**: {definition}\n")
+        parts.append("\n")
+    
+    # Add business metrics
+    if 'metrics' in business_rules:
+        parts.append("## Business Metrics\n")
+        for metric, definition in business_rules['metrics'].items():
+            parts.append(f"- **{metric}**: {definition}\n")
+        parts.append("\n")
+    
+    # Add calculation rules
+    if 'calculations' in business_rules:
+        parts.append("## Calculation Rules\n")
+        for rule, formula in business_rules['calculations'].items():
+            parts.append(f"- **{rule}**: {formula}\n")
+    
+    content = ''.join(parts)
+    
+    return {
+        'id': 'business_rules',
+        'content': content,
+        'metadata': {
+            'type': 'business',
+            'created_at': created_at or datetime.now().isoformat()
+        }
+    }
+
+
+def _generate_table_ddl(table_info: Dict[str, Any]) -> str:
+    """Generate DDL for a table."""
+    ddl_parts = [f"CREATE TABLE {table_info['name']} ("]
+    
+    # Add columns
+    column_defs = []
+    for col in table_info['columns']:
+        col_def = f"    {col['name']} {col['type']}"
+        if not col['nullable']:
+            col_def += " NOT NULL"
+        column_defs.append(col_def)
+    
+    # Add primary key
+    pk_columns = [col['name'] for col in table_info['columns'] if col['is_primary']]
+    if pk_columns:
+        column_defs.append(f"    PRIMARY KEY ({', '.join(pk_columns)})")
+    
+    ddl_parts.append(',\n'.join(column_defs))
+    ddl_parts.append(")")
+    
+    return '\n'.join(ddl_parts)
+
+
+def _extract_enum_values(table_info: Dict[str, Any]) -> Dict[str, str]:
+    """Extract enum values from column comments."""
+    enum_values = {}
+    
+    for col in table_info['columns']:
+        if col['comment']:
+            # Look for patterns like "status: 1=成功, 2=失败"
+            matches = _ENUM_RE.findall(col['comment'])
+            if matches:
+                enum_values[col['name']] = ', '.join([f"{m[0]} means '{m[1]}'" for m in matches])
+    
+    return enum_values
+
+
+def _generate_synonyms(table_name: str, table_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate synonyms for table and columns."""
+    synonyms = {}
+    
+    # Table synonyms (could be enhanced with LLM or dictionary)
+    lower_name = table_name.lower()
+    table_synonyms = [
+        syn
+        for keyword, syns in _TABLE_SYNONYMS.items() if keyword in lower_name
+        for syn in syns
+    ]
+    
+    if table_synonyms:
+        synonyms['table'] = table_synonyms
+    
+    # Column synonyms
+    column_synonyms = {}
+    for col in table_info['columns']:
+        col_name = col['name'].lower()
+        syns = [
+            syn
+            for keywords, group in _COLUMN_SYNONYMS
+            if any(keyword in col_name for keyword in keywords)
+            for syn in group
+        ]
+        # A bare "id" is the table's own key, not a reference
+        if 'id' in col_name and col_name != 'id':
+            syns.extend(_ID_SYNONYMS)
+        
+        if syns:
+            column_synonyms[col['name']] = syns
+    
+    if column_synonyms:
+        synonyms['columns'] = column_synonyms
+    
+    return synonyms
+
+
+def _create_table_chunk_in_worker(
+    item: Tuple[str, Dict[str, Any], Optional[Dict[str, Any]], str]
+) -> Dict[str, Any]:
+    """Process pool entry point for table chunk creation."""
+    return _create_table_chunk(*item)
\ No newline at end of file
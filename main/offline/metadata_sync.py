@@ -1,10 +1,67 @@
 import logging
-from typing import Dict, List, Any, Optional, Tuple
-from sqlalchemy import create_engine, inspect, MetaData, Table, text
-from sqlalchemy.engine import reflection
-import json
+import sys
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple, Iterator
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Connection, Inspector
+import orjson
 
 from ..config import settings
+from ..core.database import get_engine
+
+# Tables reflected per batch of bulk inspector queries
+REFLECTION_PAGE_SIZE = 256
+
+# Generated table DDL kept per MetadataSync until refresh()
+SCHEMA_DDL_CACHE_SIZE = 256
+
+
+def _pack_columns(columns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert a table's column dicts into parallel arrays for storage.
+    
+    Keys are written once per table instead of once per column; primary
+    and foreign key flags become lists of column positions.
+    """
+    return {
+        'names': [col['name'] for col in columns],
+        'types': [col['type'] for col in columns],
+        'nullable': [col['nullable'] for col in columns],
+        'defaults': [col['default'] for col in columns],
+        'comments': [col['comment'] for col in columns],
+        'primary': [i for i, col in enumerate(columns) if col['is_primary']],
+        'foreign': [i for i, col in enumerate(columns) if col['is_foreign']],
+        'references': {
+            col['name']: col['references'] for col in columns if 'references' in col
+        }
+    }
+
+
+def _unpack_columns(store: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rebuild the column dicts of a table from its stored parallel arrays."""
+    primary = set(store['primary'])
+    foreign = set(store['foreign'])
+    references = store['references']
+    
+    columns = []
+    for i, (name, type_, nullable, default, comment) in enumerate(zip(
+        store['names'], store['types'], store['nullable'],
+        store['defaults'], store['comments']
+    )):
+        column = {
+            'name': name,
+            'type': sys.intern(type_),
+            'nullable': nullable,
+            'default': default,
+            'comment': comment,
+            'is_primary': i in primary,
+            'is_foreign': i in foreign
+        }
+        if name in references:
+            column['references'] = references[name]
+        columns.append(column)
+    return columns
 
 
 class MetadataSync:
@@ -15,6 +72,7 @@ class MetadataSync:
         self.logger = logging.getLogger(__name__)
         self.engine = None
         self.inspector = None
+        self._schema_ddl = lru_cache(maxsize=SCHEMA_DDL_CACHE_SIZE)(self._build_schema_ddl)
         
     def connect(self, database_url: str = None) -> None:
         """
@@ -27,13 +85,21 @@ class MetadataSync:
             if database_url is None:
                 database_url = settings.database_url
                 
-            self.engine = create_engine(database_url)
+            self.engine = get_engine(database_url)
+            # Kept for the life of the connection: its info_cache is what lets
+            # repeated reflection calls hit the dialect's @reflection.cache
             self.inspector = inspect(self.engine)
             self.logger.info(f"Connected to database: {database_url.split('@')[1] if '@' in database_url else database_url}")
         except Exception as e:
             self.logger.error(f"Failed to connect to database: {e}")
             raise
     
+    def refresh(self) -> None:
+        """Drop cached reflection results so the next read sees schema changes."""
+        if self.inspector is not None:
+            self.inspector.clear_cache()
+        self._schema_ddl.cache_clear()
+    
     def extract_metadata(self) -> Dict[str, Any]:
         """
         Extract complete metadata from the database.
@@ -52,14 +118,17 @@ class MetadataSync:
             }
             
             # Extract table information
-            table_names = self.inspector.get_table_names()
-            
-            for table_name in table_names:
-                table_info = self._extract_table_info(table_name)
-                metadata['tables'][table_name] = table_info
-            
-            # Extract relationships
-            metadata['relationships'] = self._extract_relationships(table_names)
+            with self._batch_connection() as (conn, inspector):
+                table_names = inspector.get_table_names()
+                
+                for start in range(0, len(table_names), REFLECTION_PAGE_SIZE):
+                    page = table_names[start:start + REFLECTION_PAGE_SIZE]
+                    tables = self._extract_tables(page, conn, inspector)
+                    for table_name, (table_info, foreign_keys) in tables.items():
+                        metadata['tables'][table_name] = table_info
+                        metadata['relationships'].extend(
+                            self._extract_relationships(table_name, foreign_keys)
+                        )
             
             self.logger.info(f"Extracted metadata for {len(table_names)} tables")
             return metadata
@@ -68,90 +137,195 @@ class MetadataSync:
             self.logger.error(f"Error extracting metadata: {e}")
             raise
     
-    def _extract_table_info(self, table_name: str) -> Dict[str, Any]:
-        """Extract information for a single table."""
-        try:
-            # Get table comment
-            table_comment = self.inspector.get_table_comment(table_name)
-            
-            # Get columns
-            columns = []
-            primary_keys = self.inspector.get_pk_constraint(table_name)['constrained_columns']
-            foreign_keys = self.inspector.get_foreign_keys(table_name)
-            
-            for column in self.inspector.get_columns(table_name):
-                column_info = {
-                    'name': column['name'],
-                    'type': str(column['type']),
-                    'nullable': column.get('nullable', True),
-                    'default': column.get('default'),
-                    'comment': column.get('comment', ''),
-                    'is_primary': column['name'] in primary_keys,
-                    'is_foreign': any(fk['constrained_columns'] == [column['name']] for fk in foreign_keys)
-                }
-                
-                # Add foreign key reference info
-                if column_info['is_foreign']:
-                    fk_info = next(fk for fk in foreign_keys if fk['constrained_columns'] == [column['name']])
-                    column_info['references'] = {
-                        'table': fk['referred_table'],
-                        'column': fk['referred_columns'][0]
-                    }
-                
-                columns.append(column_info)
-            
-            # Get indexes
-            indexes = self.inspector.get_indexes(table_name)
-            
-            table_info = {
-                'name': table_name,
-                'comment': table_comment.get('text', ''),
-                'columns': columns,
-                'indexes': indexes,
-                'row_count': self._get_table_row_count(table_name)
-            }
-            
-            return table_info
+    def iter_tables(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yield (table_name, table_info) one table at a time.
+        
+        Tables are reflected a page at a time, so callers can start
+        processing early tables while later pages are still being reflected.
+        """
+        if not self.engine:
+            self.connect()
+        
+        with self._batch_connection() as (conn, inspector):
+            table_names = inspector.get_table_names()
+            for start in range(0, len(table_names), REFLECTION_PAGE_SIZE):
+                page = table_names[start:start + REFLECTION_PAGE_SIZE]
+                for table_name, (table_info, _) in self._extract_tables(page, conn, inspector).items():
+                    yield table_name, table_info
+    
+    @contextmanager
+    def _batch_connection(self) -> Iterator[Tuple[Connection, Inspector]]:
+        """
+        Check out one connection, with an inspector bound to it, for a batch
+        of reflection queries instead of a pool checkout (and pre-ping) per query.
+        """
+        with self.engine.connect() as conn:
+            inspector = inspect(conn)
+            # Share the long-lived inspector's cache so results outlive the batch
+            inspector.info_cache = self.inspector.info_cache
+            yield conn, inspector
+    
+    def _extract_single_table(self, table_name: str) -> Dict[str, Any]:
+        """Reflect one table without walking the rest of the schema."""
+        if not self.engine:
+            self.connect()
+        with self._batch_connection() as (conn, inspector):
+            return self._extract_tables([table_name], conn, inspector)[table_name][0]
+    
+    def _extract_tables(
+        self,
+        table_names: List[str],
+        conn: Connection,
+        inspector: Inspector
+    ) -> Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Reflect several tables with one bulk query per kind of metadata.
+        
+        Args:
+            table_names: Tables to reflect
+            conn: Connection to run the queries on
+            inspector: Inspector bound to conn
             
+        Returns:
+            Mapping of table name to (table_info, foreign_keys)
+        """
+        try:
+            columns = inspector.get_multi_columns(filter_names=table_names)
+            primary_keys = inspector.get_multi_pk_constraint(filter_names=table_names)
+            foreign_keys = inspector.get_multi_foreign_keys(filter_names=table_names)
+            indexes = inspector.get_multi_indexes(filter_names=table_names)
+            try:
+                comments = inspector.get_multi_table_comment(filter_names=table_names)
+            except NotImplementedError:
+                # Dialects without table comments (e.g. SQLite)
+                comments = {}
+            row_counts = self._get_table_row_counts(table_names, conn)
         except Exception as e:
-            self.logger.error(f"Error extracting table info for {table_name}: {e}")
+            self.logger.error(f"Error reflecting tables: {e}")
             raise
-    
-    def _extract_relationships(self, table_names: List[str]) -> List[Dict[str, Any]]:
-        """Extract foreign key relationships between tables."""
-        relationships = []
         
+        tables = {}
         for table_name in table_names:
-            foreign_keys = self.inspector.get_foreign_keys(table_name)
+            key = (None, table_name)
+            table_fks = foreign_keys.get(key, [])
+            tables[table_name] = (
+                self._assemble_table_info(
+                    table_name,
+                    columns.get(key, []),
+                    primary_keys.get(key, {}).get('constrained_columns', []),
+                    table_fks,
+                    indexes.get(key, []),
+                    comments.get(key, {}).get('text'),
+                    row_counts.get(table_name, 0)
+                ),
+                table_fks
+            )
+        return tables
+    
+    def _assemble_table_info(
+        self,
+        table_name: str,
+        columns: List[Dict[str, Any]],
+        primary_keys: List[str],
+        foreign_keys: List[Dict[str, Any]],
+        indexes: List[Dict[str, Any]],
+        comment: Optional[str],
+        row_count: int
+    ) -> Dict[str, Any]:
+        """Build the info dict for a single table from reflected metadata."""
+        # Single-column foreign keys by their column
+        fk_by_column = {}
+        for fk in foreign_keys:
+            if len(fk['constrained_columns']) == 1:
+                fk_by_column.setdefault(fk['constrained_columns'][0], fk)
+        
+        column_infos = []
+        for column in columns:
+            fk = fk_by_column.get(column['name'])
+            column_info = {
+                'name': column['name'],
+                # Few distinct types recur across thousands of columns
+                'type': sys.intern(str(column['type'])),
+                'nullable': column.get('nullable', True),
+                'default': column.get('default'),
+                'comment': column.get('comment', ''),
+                'is_primary': column['name'] in primary_keys,
+                'is_foreign': fk is not None
+            }
             
-            for fk in foreign_keys:
-                relationship = {
-                    'from_table': table_name,
-                    'from_columns': fk['constrained_columns'],
-                    'to_table': fk['referred_table'],
-                    'to_columns': fk['referred_columns'],
-                    'name': fk.get('name', f"fk_{table_name}_{'_'.join(fk['constrained_columns'])}")
+            # Add foreign key reference info
+            if fk is not None:
+                column_info['references'] = {
+                    'table': fk['referred_table'],
+                    'column': fk['referred_columns'][0]
                 }
-                relationships.append(relationship)
+            
+            column_infos.append(column_info)
+        
+        return {
+            'name': table_name,
+            'comment': comment or '',
+            'columns': column_infos,
+            'indexes': indexes,
+            'row_count': row_count
+        }
+    
+    def _extract_relationships(
+        self,
+        table_name: str,
+        foreign_keys: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Build relationship entries from a table's foreign keys."""
+        relationships = []
+        
+        for fk in foreign_keys:
+            relationship = {
+                'from_table': table_name,
+                'from_columns': fk['constrained_columns'],
+                'to_table': fk['referred_table'],
+                'to_columns': fk['referred_columns'],
+                'name': fk.get('name', f"fk_{table_name}_{'_'.join(fk['constrained_columns'])}")
+            }
+            relationships.append(relationship)
         
         return relationships
     
-    def _get_table_row_count(self, table_name: str) -> int:
-        """Get approximate row count for a table."""
+    def _get_table_row_counts(self, table_names: List[str], conn: Connection) -> Dict[str, int]:
+        """Get approximate row counts for several tables in a single query."""
+        if not table_names:
+            return {}
+        
         try:
-            with self.engine.connect() as conn:
-                if settings.db_type == "mysql":
-                    result = conn.execute(text(f"SELECT TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '{settings.db_name}' AND TABLE_NAME = '{table_name}'"))
-                elif settings.db_type == "postgresql":
-                    result = conn.execute(text(f"SELECT reltuples::bigint FROM pg_class WHERE relname = '{table_name}'"))
-                else:
-                    # Fallback to exact count
-                    result = conn.execute(text(f"SELECT COUNT(*) FROM {table_name}"))
-                
-                return result.scalar() or 0
+            if settings.db_type == "mysql":
+                result = conn.execute(
+                    text(
+                        "SELECT TABLE_NAME, TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES "
+                        "WHERE TABLE_SCHEMA = :schema AND TABLE_NAME IN :names"
+                    ).bindparams(bindparam('names', expanding=True)),
+                    {'schema': settings.db_name, 'names': list(table_names)}
+                )
+            elif settings.db_type == "postgresql":
+                result = conn.execute(
+                    text("SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(:names)"),
+                    {'names': list(table_names)}
+                )
+            elif settings.db_exact_row_counts:
+                # No statistics catalog: exact counts, one round trip for all tables
+                quote = self.engine.dialect.identifier_preparer.quote
+                result = conn.execute(text(' UNION ALL '.join(
+                    f"SELECT :name_{i}, COUNT(*) FROM {quote(name)}"
+                    for i, name in enumerate(table_names)
+                )), {f'name_{i}': name for i, name in enumerate(table_names)})
+            else:
+                return {}
+            
+            return {name: count or 0 for name, count in result}
         except Exception as e:
-            self.logger.warning(f"Could not get row count for {table_name}: {e}")
-            return 0
+            self.logger.warning(f"Could not get row counts: {e}")
+            # Leave the shared connection usable for the next page
+            conn.rollback()
+            return {}
     
     def save_metadata(self, metadata: Dict[str, Any], file_path: str = "metadata.json") -> None:
         """
@@ -162,8 +336,19 @@ class MetadataSync:
             file_path: Output file path
         """
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            # Columns are stored column-wise; load_metadata restores them
+            tables = {
+                name: {
+                    **{key: value for key, value in info.items() if key != 'columns'},
+                    'column_store': _pack_columns(info['columns'])
+                }
+                for name, info in metadata.get('tables', {}).items()
+            }
+            with open(file_path, 'wb') as f:
+                f.write(orjson.dumps(
+                    {**metadata, 'tables': tables},
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+                ))
             self.logger.info(f"Metadata saved to {file_path}")
         except Exception as e:
             self.logger.error(f"Error saving metadata: {e}")
@@ -180,8 +365,13 @@ class MetadataSync:
             Metadata dictionary
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+            with open(file_path, 'rb') as f:
+                metadata = orjson.loads(f.read())
+            
+            # Files written before the columnar layout already hold 'columns'
+            for table_info in metadata.get('tables', {}).values():
+                if 'column_store' in table_info:
+                    table_info['columns'] = _unpack_columns(table_info.pop('column_store'))
             self.logger.info(f"Metadata loaded from {file_path}")
             return metadata
         except Exception as e:
@@ -197,15 +387,13 @@ class MetadataSync:
             comment: New comment
         """
         try:
-            if settings.db_type == "mysql":
-                with self.engine.connect() as conn:
-                    conn.execute(text(f"ALTER TABLE {table_name} COMMENT = '{comment}'"))
-                    conn.commit()
-            elif settings.db_type == "postgresql":
+            statement = self._comment_statement(table_name, None)
+            if statement is not None:
                 with self.engine.connect() as conn:
-                    conn.execute(text(f"COMMENT ON TABLE {table_name} IS '{comment}'"))
+                    conn.execute(statement, {'comment': comment})
                     conn.commit()
             
+            self.refresh()
             self.logger.info(f"Updated comment for table {table_name}")
         except Exception as e:
             self.logger.error(f"Error updating table comment: {e}")
@@ -221,30 +409,92 @@ class MetadataSync:
             comment: New comment
         """
         try:
-            if settings.db_type == "mysql":
+            statement = self._comment_statement(table_name, column_name)
+            if statement is not None:
                 with self.engine.connect() as conn:
-                    conn.execute(text(f"ALTER TABLE {table_name} MODIFY COLUMN {column_name} {self._get_column_type(table_name, column_name)} COMMENT '{comment}'"))
-                    conn.commit()
-            elif settings.db_type == "postgresql":
-                with self.engine.connect() as conn:
-                    conn.execute(text(f"COMMENT ON COLUMN {table_name}.{column_name} IS '{comment}'"))
+                    conn.execute(statement, {'comment': comment})
                     conn.commit()
             
+            self.refresh()
             self.logger.info(f"Updated comment for {table_name}.{column_name}")
         except Exception as e:
             self.logger.error(f"Error updating column comment: {e}")
             raise
     
+    def update_comments_bulk(self, updates: List[Tuple[str, Optional[str], str]]) -> None:
+        """
+        Update many table and column comments in one transaction.
+        
+        Args:
+            updates: (table_name, column_name, comment) tuples; a column_name
+                of None updates the table's own comment
+        """
+        try:
+            # Build every statement first, so an unknown table or column
+            # aborts before anything is written
+            statements = [
+                (self._comment_statement(table_name, column_name), comment)
+                for table_name, column_name, comment in updates
+            ]
+            
+            with self.engine.begin() as conn:
+                for statement, comment in statements:
+                    if statement is not None:
+                        conn.execute(statement, {'comment': comment})
+            
+            self.refresh()
+            self.logger.info(f"Updated {len(updates)} comments")
+        except Exception as e:
+            self.logger.error(f"Error updating comments: {e}")
+            raise
+    
+    def _comment_statement(self, table_name: str, column_name: Optional[str]):
+        """
+        Build the statement setting a table or column comment, bound to :comment.
+        
+        Returns:
+            The statement, or None if the database type has no comment DDL
+        """
+        # Identifiers can't be bound: check they exist, then quote them
+        table = self._quote_table(table_name)
+        
+        if column_name is None:
+            if settings.db_type == "mysql":
+                return text(f"ALTER TABLE {table} COMMENT = :comment")
+            if settings.db_type == "postgresql":
+                return text(f"COMMENT ON TABLE {table} IS :comment")
+            return None
+        
+        column_type = self._get_column_type(table_name, column_name)
+        column = self.engine.dialect.identifier_preparer.quote(column_name)
+        
+        if settings.db_type == "mysql":
+            return text(f"ALTER TABLE {table} MODIFY COLUMN {column} {column_type} COMMENT :comment")
+        if settings.db_type == "postgresql":
+            return text(f"COMMENT ON COLUMN {table}.{column} IS :comment")
+        return None
+    
     def _get_column_type(self, table_name: str, column_name: str) -> str:
         """Get the SQL type definition for a column."""
+        # Repeat lookups are served from the inspector's info_cache
         columns = self.inspector.get_columns(table_name)
-        column = next(c for c in columns if c['name'] == column_name)
+        column = next((c for c in columns if c['name'] == column_name), None)
+        if column is None:
+            raise ValueError(f"Unknown column: {table_name}.{column_name}")
         return str(column['type'])
     
+    def _quote_table(self, table_name: str) -> str:
+        """Quote a table name for DDL after checking that the table exists."""
+        if not self.inspector.has_table(table_name):
+            raise ValueError(f"Unknown table: {table_name}")
+        return self.engine.dialect.identifier_preparer.quote(table_name)
+    
     def generate_schema_ddl(self, table_name: str) -> str:
         """
         Generate DDL for a specific table.
         
+        Results are cached until refresh(), which comment updates call.
+        
         Args:
             table_name: Table name
             
@@ -252,35 +502,32 @@ class MetadataSync:
             DDL string
         """
         try:
-            table_info = self.extract_metadata()['tables'][table_name]
-            
-            # Build CREATE TABLE statement
-            ddl_parts = [f"CREATE TABLE {table_name} ("]
-            
-            # Add columns
-            column_defs = []
-            for col in table_info['columns']:
-                col_def = f"    {col['name']} {col['type']}"
-                if not col['nullable']:
-                    col_def += " NOT NULL"
-                if col['comment']:
-                    col_def += f" COMMENT '{col['comment']}'"
-                column_defs.append(col_def)
-            
-            # Add primary key
-            pk_columns = [col['name'] for col in table_info['columns'] if col['is_primary']]
-            if pk_columns:
-                column_defs.append(f"    PRIMARY KEY ({', '.join(pk_columns)})")
-            
-            ddl_parts.append(',\n'.join(column_defs))
-            ddl_parts.append(")")
-            
-            # Add table comment
-            if table_info['comment']:
-                ddl_parts.append(f"COMMENT = '{table_info['comment']}'")
-            
-            return '\n'.join(ddl_parts) + ';'
-            
+            return self._schema_ddl(table_name)
         except Exception as e:
             self.logger.error(f"Error generating DDL for {table_name}: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    def _build_schema_ddl(self, table_name: str) -> str:
+        """Build the CREATE TABLE statement for one table; wrapped in an LRU cache."""
+        table_info = self._extract_single_table(table_name)
+        columns = table_info['columns']
+        
+        column_defs = [
+            f"    {col['name']} {col['type']}"
+            + ('' if col['nullable'] else " NOT NULL")
+            + (f" COMMENT '{col['comment']}'" if col['comment'] else '')
+            for col in columns
+        ]
+        
+        # Add primary key
+        pk_columns = [col['name'] for col in columns if col['is_primary']]
+        if pk_columns:
+            column_defs.append(f"    PRIMARY KEY ({', '.join(pk_columns)})")
+        
+        ddl = f"CREATE TABLE {table_name} (\n" + ',\n'.join(column_defs) + "\n)"
+        
+        # Add table comment
+        if table_info['comment']:
+            ddl += f"\nCOMMENT = '{table_info['comment']}'"
+        
+        return ddl + ';'
@@ -1,13 +1,60 @@
 import logging
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+import re
+from typing import Dict, List, Any, Optional, Tuple, Iterator
 
-from ..config import settings
+# Query feature bits, shared by queries and few-shot examples
+_AGGREGATION = 1
+_JOIN = 2
+_TIME_FILTER = 4
+_RANKING = 8
+
+# Query keywords by feature, scanned in a single pass; no keyword
+# shares a character with another feature's, so matches never mask each other
+_FEATURE_RE = re.compile(
+    '(?P<time>上周|昨天|本月|今年)'
+    '|(?P<agg>统计|总数|平均|总计)'
+    '|(?P<rank>最高|最低|前|排名)'
+)
+_FEATURE_BITS = {'time': _TIME_FILTER, 'agg': _AGGREGATION, 'rank': _RANKING}
+
+# Aggregate calls in few-shot example SQL
+_SQL_AGG_RE = re.compile(r'SUM\(|COUNT\(|AVG\(')
+
+# Fenced SQL block inside a schema chunk document
+_SQL_BLOCK_RE = re.compile(r'```sql(.*?)```', re.DOTALL)
 
 
 class PromptBuilder:
     """Builds optimized prompts for SQL generation."""
     
+    # Static prompt sections
+    _ROLE_INSTRUCTION = """你是一个世界级的数据库专家和SQL工程师。你的任务是根据用户的问题和提供的数据表结构，生成准确、高效的SQL查询。
+
+请严格遵循以下规则：
+1. 只使用提供的表和字段，不要编造任何不存在的字段
+2. 注意表之间的关联关系，正确使用JOIN
+3. 对于复杂的计算逻辑，使用CTE（WITH语句）提高可读性
+4. 确保生成的SQL语法正确且可执行
+5. 根据查询需求选择合适的聚合函数"""
+    
+    _CONSTRAINTS = """\nSQL约束：
+1. 使用标准SQL语法
+2. 确保所有表名和字段名都存在
+3. 正确处理NULL值
+4. 使用适当的索引提示（如果需要）
+5. 避免使用SELECT *，明确指定需要的字段
+
+请将最终的SQL代码包裹在```sql ... ```中。"""
+    
+    _BIZ_PREFIX = "\n业务规则和定义：\n"
+    
+    # Static text around the variable sections, joined with their
+    # separators once so each prompt only yields the parts that change
+    _PROMPT_HEAD = _ROLE_INSTRUCTION + '\n\n'
+    _BIZ_SECTION = '\n\n' + _BIZ_PREFIX
+    _CONSTRAINTS_SECTION = '\n\n' + _CONSTRAINTS
+    _QUESTION_SECTION = '\n\n\n现在，请为以下问题生成SQL查询：\n"'
+    
     def __init__(self):
         """Initialize prompt builder."""
         self.logger = logging.getLogger(__name__)
@@ -30,6 +77,12 @@ class PromptBuilder:
                 'context': 'users和orders表通过user_id关联'
             }
         ]
+        
+        # Feature bits of each example, computed once
+        self._indexed_examples: List[Tuple[int, Dict[str, Any]]] = [
+            (self._example_features(example), example)
+            for example in self.few_shot_examples
+        ]
     
     def build_sql_generation_prompt(
         self,
@@ -52,38 +105,70 @@ class PromptBuilder:
         Returns:
             Complete prompt string
         """
-        prompt_parts = []
+        complete_prompt = ''.join(self.iter_sql_generation_prompt(
+            query, schema_context, business_rules, few_shot_examples, include_constraints
+        ))
+        
+        self.logger.debug(f"Built prompt with {len(complete_prompt)} characters")
+        return complete_prompt
+    
+    def iter_sql_generation_prompt(
+        self,
+        query: str,
+        schema_context: Dict[str, Any],
+        business_rules: Optional[str] = None,
+        few_shot_examples: Optional[List[Dict[str, Any]]] = None,
+        include_constraints: bool = True
+    ) -> Iterator[str]:
+        """
+        Yield the SQL generation prompt piece by piece.
+        
+        The schema section is yielded per table, so a caller can stream a
+        large prompt to a file or socket without holding all of it. Joined,
+        the pieces equal build_sql_generation_prompt's result.
+        
+        Args:
+            query: User's natural language query
+            schema_context: Retrieved schema information
+            business_rules: Optional business rules
+            few_shot_examples: Optional custom examples
+            include_constraints: Whether to include SQL constraints
+            
+        Yields:
+            Consecutive fragments of the prompt
+        """
+        # Classified once, shared by example selection and query hints
+        features = self._query_features(query, schema_context)
         
         # 1. Role and instructions
-        prompt_parts.append(self._build_role_instruction())
+        yield self._PROMPT_HEAD
         
         # 2. Schema context
-        prompt_parts.append(self._build_schema_context(schema_context))
+        yield from self._iter_schema_context(schema_context)
         
         # 3. Business rules
         if business_rules:
-            prompt_parts.append(self._build_business_context(business_rules))
+            yield self._BIZ_SECTION
+            yield business_rules
         
         # 4. Few-shot examples
-        examples = few_shot_examples or self._select_relevant_examples(query, schema_context)
+        examples = few_shot_examples or self._select_relevant_examples(features)
         if examples:
-            prompt_parts.append(self._build_few_shot_examples(examples))
+            yield '\n\n'
+            yield self._build_few_shot_examples(examples)
         
         # 5. Query-specific context
-        prompt_parts.append(self._build_query_context(query, schema_context))
+        yield '\n\n'
+        yield self._build_query_context(features)
         
         # 6. Constraints
         if include_constraints:
-            prompt_parts.append(self._build_constraints())
+            yield self._CONSTRAINTS_SECTION
         
         # 7. Final instruction
-        prompt_parts.append(f'\n现在，请为以下问题生成SQL查询：\n"{query}"')
-        
-        # Join all parts
-        complete_prompt = '\n\n'.join(prompt_parts)
-        
-        self.logger.debug(f"Built prompt with {len(complete_prompt)} characters")
-        return complete_prompt
+        yield self._QUESTION_SECTION
+        yield query
+        yield '"'
     
     def build_correction_prompt(
         self,
@@ -129,53 +214,35 @@ class PromptBuilder:
 
         return prompt
     
-    def _build_role_instruction(self) -> str:
-        """Build role and instruction section."""
-        return """你是一个世界级的数据库专家和SQL工程师。你的任务是根据用户的问题和提供的数据表结构，生成准确、高效的SQL查询。
-
-请严格遵循以下规则：
-1. 只使用提供的表和字段，不要编造任何不存在的字段
-2. 注意表之间的关联关系，正确使用JOIN
-3. 对于复杂的计算逻辑，使用CTE（WITH语句）提高可读性
-4. 确保生成的SQL语法正确且可执行
-5. 根据查询需求选择合适的聚合函数"""
-    
     def _build_schema_context(self, schema_context: Dict[str, Any]) -> str:
         """Build schema context section."""
-        context_parts = ["数据表结构信息："]
+        return ''.join(self._iter_schema_context(schema_context))
+    
+    def _iter_schema_context(self, schema_context: Dict[str, Any]) -> Iterator[str]:
+        """Yield the schema context section one table at a time."""
+        yield "数据表结构信息："
         
         # Add each table's schema
         for table in schema_context.get('tables', []):
-            table_name = table['name']
-            context_parts.append(f"\n--- 表: {table_name} ---")
+            yield f"\n\n--- 表: {table['name']} ---"
             
             # Extract CREATE TABLE from document
             doc = table['document']
             if '```sql' in doc:
                 # Extract SQL block
-                start = doc.find('```sql') + 6
-                end = doc.find('```', start)
-                if end > start:
-                    sql_part = doc[start:end].strip()
-                    context_parts.append(sql_part)
+                match = _SQL_BLOCK_RE.search(doc)
+                if match:
+                    yield '\n' + match.group(1).strip()
             else:
                 # Fallback: include the whole document
-                context_parts.append(doc)
+                yield '\n' + doc
         
         # Add relationships if any
         relationships = schema_context.get('relationships', [])
         if relationships:
-            context_parts.append("\n表关系：")
+            yield "\n\n表关系："
             for rel in relationships:
-                context_parts.append(
-                    f"- {rel['from_table']}.{rel['from_column']} -> {rel['to_table']}.{rel['to_column']}"
-                )
-        
-        return '\n'.join(context_parts)
-    
-    def _build_business_context(self, business_rules: str) -> str:
-        """Build business rules context section."""
-        return f"\n业务规则和定义：\n{business_rules}"
+                yield f"\n- {rel['from_table']}.{rel['from_column']} -> {rel['to_table']}.{rel['to_column']}"
     
     def _build_few_shot_examples(self, examples: List[Dict[str, Any]]) -> str:
         """Build few-shot examples section."""
@@ -190,27 +257,24 @@ class PromptBuilder:
         
         return '\n'.join(examples_text)
     
-    def _build_query_context(self, query: str, schema_context: Dict[str, Any]) -> str:
-        """Build query-specific context."""
+    def _build_query_context(self, features: int) -> str:
+        """Build query-specific context from the query's feature bits."""
         context_parts = []
         
-        # Extract query characteristics
-        query_lower = query.lower()
-        
         # Time-based queries
-        if any(time_word in query_lower for time_word in ['上周', '昨天', '本月', '今年']):
+        if features & _TIME_FILTER:
             context_parts.append("这是一个时间范围查询，请使用适当的日期函数。")
         
         # Aggregation queries
-        if any(agg_word in query_lower for agg_word in ['统计', '总数', '平均', '总计']):
+        if features & _AGGREGATION:
             context_parts.append("这是一个聚合查询，请使用GROUP BY和聚合函数。")
         
         # Ranking queries
-        if any(rank_word in query_lower for rank_word in ['最高', '最低', '前', '排名']):
+        if features & _RANKING:
             context_parts.append("这是一个排名查询，请使用ORDER BY和LIMIT。")
         
         # Multiple tables
-        if len(schema_context.get('tables', [])) > 1:
+        if features & _JOIN:
             context_parts.append("查询涉及多个表，请正确使用JOIN。")
         
         if context_parts:
@@ -218,60 +282,44 @@ class PromptBuilder:
         
         return ""
     
-    def _build_constraints(self) -> str:
-        """Build SQL constraints section."""
-        return """\nSQL约束：
-1. 使用标准SQL语法
-2. 确保所有表名和字段名都存在
-3. 正确处理NULL值
-4. 使用适当的索引提示（如果需要）
-5. 避免使用SELECT *，明确指定需要的字段
-
-请将最终的SQL代码包裹在```sql ... ```中。"""
+    def _select_relevant_examples(self, features: int) -> List[Dict[str, Any]]:
+        """Select few-shot examples sharing a feature bit with the query."""
+        # An example is relevant if it shares any feature with the query
+        relevant_examples = [
+            example for example_features, example in self._indexed_examples
+            if features & example_features
+        ]
+        
+        # Return up to 2 relevant examples
+        return relevant_examples[:2]
     
-    def _select_relevant_examples(
-        self, 
-        query: str, 
-        schema_context: Dict[str, Any]
-    ) -> List[Dict[str, Any]]:
-        """Select relevant few-shot examples based on query."""
+    def _query_features(self, query: str, schema_context: Dict[str, Any]) -> int:
+        """Feature bits of a natural language query."""
         query_lower = query.lower()
-        relevant_examples = []
+        features = 0
         
-        # Table names in context
-        table_names = [t['name'] for t in schema_context.get('tables', [])]
+        for match in _FEATURE_RE.finditer(query_lower):
+            features |= _FEATURE_BITS[match.lastgroup]
+        if len(schema_context.get('tables', [])) > 1:
+            features |= _JOIN
         
-        # Query characteristics
-        has_aggregation = any(word in query_lower for word in ['统计', '总数', '平均', '总计'])
-        has_join = len(table_names) > 1
-        has_time_filter = any(word in query_lower for word in ['上周', '昨天', '本月', '今年'])
-        has_ranking = any(word in query_lower for word in ['最高', '最低', '前', '排名'])
+        return features
+    
+    def _example_features(self, example: Dict[str, Any]) -> int:
+        """Feature bits a few-shot example demonstrates, judged from its SQL."""
+        sql = example['sql']
+        features = 0
         
-        # Select examples based on characteristics
-        for example in self.few_shot_examples:
-            example_relevant = False
-            
-            # Check for aggregation
-            if has_aggregation and 'SUM(' in example['sql']:
-                example_relevant = True
-            
-            # Check for JOIN
-            if has_join and 'JOIN' in example['sql']:
-                example_relevant = True
-            
-            # Check for time filter
-            if has_time_filter and 'WHERE' in example['sql']:
-                example_relevant = True
-            
-            # Check for ranking
-            if has_ranking and ('ORDER BY' in example['sql'] and 'LIMIT' in example['sql']):
-                example_relevant = True
-            
-            if example_relevant:
-                relevant_examples.append(example)
+        if _SQL_AGG_RE.search(sql):
+            features |= _AGGREGATION
+        if 'JOIN' in sql:
+            features |= _JOIN
+        if 'WHERE' in sql:
+            features |= _TIME_FILTER
+        if 'ORDER BY' in sql and 'LIMIT' in sql:
+            features |= _RANKING
         
-        # Return up to 2 relevant examples
-        return relevant_examples[:2]
+        return features
     
     def build_validation_prompt(self, sql: str, schema_context: Dict[str, Any]) -> str:
         """Build prompt for SQL validation."""
@@ -1,10 +1,31 @@
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
 
 from ..config import settings
 
+# Distinct (query, day) parse results kept per QueryParser
+PARSE_CACHE_SIZE = 1024
+
+# Query verbs that are never entities
+_ENTITY_STOPWORDS = frozenset({'查询', '显示', '获取', '计算', '统计'})
+
+
+def _cached_per_day(method):
+    """Cache a date-range method's result until the calendar day changes."""
+    @wraps(method)
+    def wrapper(self) -> Tuple[str, str]:
+        today = date.today().toordinal()
+        if today != self._date_cache_day:
+            self._date_cache.clear()
+            self._date_cache_day = today
+        if method.__name__ not in self._date_cache:
+            self._date_cache[method.__name__] = method(self)
+        return self._date_cache[method.__name__]
+    return wrapper
+
 
 class QueryParser:
     """Parses user queries to extract entities and intent."""
@@ -13,6 +34,10 @@ class QueryParser:
         """Initialize query parser."""
         self.logger = logging.getLogger(__name__)
         
+        # Date ranges computed today, by method name (see _cached_per_day)
+        self._date_cache: Dict[str, Tuple[str, str]] = {}
+        self._date_cache_day: Optional[int] = None
+        
         # Predefined patterns
         self.time_patterns = {
             '今天': lambda: datetime.now().date(),
@@ -44,17 +69,103 @@ class QueryParser:
             'min': ['最小值', '最低', '最小'],
             'count': ['数量', '个数', '总数']
         }
+        
+        # Checked in order; the first intent with a keyword in the query wins
+        self.intent_patterns = {
+            'aggregation': ['统计', '计算', '多少', '几个'],
+            'extreme': ['最高', '最大', '最低', '最小'],
+            'average': ['平均', '均值'],
+            'ranking': ['排名', '排行', 'top'],
+            'trend': ['趋势', '变化', '增长'],
+            'proportion': ['占比', '比例', '百分比']
+        }
+        
+        # Intent and aggregation keywords are found in one scan: the
+        # lookahead yields the longest keyword at each position, and any
+        # other keyword there is a prefix of it
+        keywords = {
+            keyword
+            for patterns in (*self.intent_patterns.values(), *self.aggregation_patterns.values())
+            for keyword in patterns
+        }
+        self._keyword_re = re.compile(
+            '(?=(' + '|'.join(map(re.escape, sorted(keywords, key=len, reverse=True))) + '))'
+        )
+        self._keyword_prefixes = {
+            keyword: [other for other in keywords if keyword.startswith(other)]
+            for keyword in keywords
+        }
+        
+        self._parse_cached = lru_cache(maxsize=PARSE_CACHE_SIZE)(self._parse)
+        
+        # Compiled once; parse_query runs every pattern on each query
+        # Relative time keywords and date formats (YYYY-MM-DD, YYYY/MM/DD,
+        # etc.) in one alternation; the group name tells them apart
+        self._date_formats = ['iso_date', 'slash_date', 'cn_date']
+        self._time_re = re.compile(
+            '(?P<relative>' + '|'.join(map(re.escape, self.time_patterns)) + ')'
+            r'|(?P<iso_date>\d{4}-\d{1,2}-\d{1,2})'
+            r'|(?P<slash_date>\d{4}/\d{1,2}/\d{1,2})'
+            r'|(?P<cn_date>\d{4}年\d{1,2}月\d{1,2}日)'
+        )
+        # Words of three or more characters; shorter ones are never entities
+        self._entity_re = re.compile(r'\w{3,}')
+        self._metric_res = [re.compile(pattern) for pattern in self.metric_patterns]
+        # Dimensions are typically group-by fields
+        # Common patterns: "按XX", "XX的", "每个XX"
+        self._dimension_res = [
+            re.compile(r'按(\w+)'),
+            re.compile(r'(\w+)的'),
+            re.compile(r'每个(\w+)'),
+            re.compile(r'各个(\w+)')
+        ]
+        self._comparison_res = [
+            (re.compile(r'(\w+)\s*(大于|>)\s*(\d+)'), 'gt'),
+            (re.compile(r'(\w+)\s*(小于|<)\s*(\d+)'), 'lt'),
+            (re.compile(r'(\w+)\s*(等于|=|是)\s*(\w+)'), 'eq'),
+            (re.compile(r'(\w+)\s*(不等于|!=|不是)\s*(\w+)'), 'ne'),
+            (re.compile(r'(\w+)\s*(在|包含)\s*([\w,]+)'), 'in'),
+            (re.compile(r'(\w+)\s*(不在|不包含)\s*([\w,]+)'), 'not_in')
+        ]
     
     def parse_query(self, query: str) -> Dict[str, Any]:
         """
         Parse user query to extract structured information.
         
+        Results are cached per query and calendar day (relative time
+        ranges move with the date); the returned dict is shared between
+        callers and must not be modified.
+        
         Args:
             query: User's natural language query
             
         Returns:
             Dictionary with parsed information
         """
+        return self._parse_cached(query, date.today().toordinal())
+    
+    def _parse(self, query: str, day: int) -> Dict[str, Any]:
+        """Parse a query; wrapped in an LRU cache keyed by query and day."""
+        # Every pattern needs a non-space character, so a blank query
+        # matches nothing and skips the extractors
+        if not query.strip():
+            return {
+                'original_query': query,
+                'entities': [],
+                'time_range': {
+                    'explicit_time': None,
+                    'relative_time': None,
+                    'start_date': None,
+                    'end_date': None
+                },
+                'metrics': [],
+                'dimensions': [],
+                'filters': [],
+                'intent': 'simple',
+                'aggregation_type': None
+            }
+        
+        keywords = self._find_keywords(query)
         parsed = {
             'original_query': query,
             'entities': self._extract_entities(query),
@@ -62,8 +173,8 @@ class QueryParser:
             'metrics': self._extract_metrics(query),
             'dimensions': self._extract_dimensions(query),
             'filters': self._extract_filters(query),
-            'intent': self._classify_intent(query),
-            'aggregation_type': self._detect_aggregation(query)
+            'intent': self._classify_intent(keywords),
+            'aggregation_type': self._detect_aggregation(keywords)
         }
         
         self.logger.info(f"Parsed query: {parsed}")
@@ -71,17 +182,12 @@ class QueryParser:
     
     def _extract_entities(self, query: str) -> List[str]:
         """Extract entities from query."""
-        entities = []
-        
-        # Extract potential table/column names (could be enhanced with NLP)
-        words = re.findall(r'\w+', query)
-        
-        # Simple heuristic: longer words are more likely to be entities
-        for word in words:
-            if len(word) > 2 and word not in ['查询', '显示', '获取', '计算', '统计']:
-                entities.append(word)
-        
-        return entities
+        # Extract potential table/column names (could be enhanced with NLP);
+        # simple heuristic: longer words are more likely to be entities
+        return [
+            word for word in self._entity_re.findall(query)
+            if word not in _ENTITY_STOPWORDS
+        ]
     
     def _extract_time_range(self, query: str) -> Dict[str, Any]:
         """Extract time range information."""
@@ -92,9 +198,18 @@ class QueryParser:
             'end_date': None
         }
         
-        # Check for explicit time patterns
+        # One scan finds both relative time expressions and dates
+        found = set()
+        dates_by_format = {date_format: [] for date_format in self._date_formats}
+        for match in self._time_re.finditer(query):
+            if match.lastgroup == 'relative':
+                found.add(match.group())
+            else:
+                dates_by_format[match.lastgroup].append(match.group())
+        
+        # Applied in pattern order so the last listed expression still wins
         for time_expr, time_func in self.time_patterns.items():
-            if time_expr in query:
+            if time_expr in found:
                 time_info['relative_time'] = time_expr
                 result = time_func()
                 if isinstance(result, tuple):
@@ -102,16 +217,8 @@ class QueryParser:
                 else:
                     time_info['explicit_time'] = result
         
-        # Check for date patterns (YYYY-MM-DD, YYYY/MM/DD, etc.)
-        date_patterns = [
-            r'\d{4}-\d{1,2}-\d{1,2}',
-            r'\d{4}/\d{1,2}/\d{1,2}',
-            r'\d{4}年\d{1,2}月\d{1,2}日'
-        ]
-        
-        dates = []
-        for pattern in date_patterns:
-            dates.extend(re.findall(pattern, query))
+        # Dates are listed format by format, as separate scans returned them
+        dates = [date for date_format in self._date_formats for date in dates_by_format[date_format]]
         
         if dates:
             time_info['explicit_time'] = dates
@@ -122,47 +229,27 @@ class QueryParser:
         """Extract metric names from query."""
         metrics = []
         
-        for pattern in self.metric_patterns:
-            matches = re.findall(pattern, query)
-            metrics.extend(matches)
+        for pattern in self._metric_res:
+            metrics.extend(pattern.findall(query))
         
-        return list(set(metrics))
+        # Ordered de-duplication, so results are deterministic
+        return list(dict.fromkeys(metrics))
     
     def _extract_dimensions(self, query: str) -> List[str]:
         """Extract dimension names from query."""
-        # Dimensions are typically group-by fields
-        # Common patterns: "按XX", "XX的", "每个XX"
-        dimension_patterns = [
-            r'按(\w+)',
-            r'(\w+)的',
-            r'每个(\w+)',
-            r'各个(\w+)'
-        ]
-        
         dimensions = []
-        for pattern in dimension_patterns:
-            matches = re.findall(pattern, query)
-            dimensions.extend(matches)
+        for pattern in self._dimension_res:
+            dimensions.extend(pattern.findall(query))
         
-        return list(set(dimensions))
+        return list(dict.fromkeys(dimensions))
     
     def _extract_filters(self, query: str) -> List[Dict[str, Any]]:
         """Extract filter conditions from query."""
         filters = []
         
         # Look for comparison patterns
-        comparison_patterns = [
-            (r'(\w+)\s*(大于|>)\s*(\d+)', 'gt'),
-            (r'(\w+)\s*(小于|<)\s*(\d+)', 'lt'),
-            (r'(\w+)\s*(等于|=|是)\s*(\w+)', 'eq'),
-            (r'(\w+)\s*(不等于|!=|不是)\s*(\w+)', 'ne'),
-            (r'(\w+)\s*(在|包含)\s*([\w,]+)', 'in'),
-            (r'(\w+)\s*(不在|不包含)\s*([\w,]+)', 'not_in')
-        ]
-        
-        for pattern, op in comparison_patterns:
-            matches = re.findall(pattern, query)
-            for match in matches:
+        for pattern, op in self._comparison_res:
+            for match in pattern.findall(query):
                 if len(match) == 3:
                     filters.append({
                         'field': match[0],
@@ -172,36 +259,30 @@ class QueryParser:
         
         return filters
     
-    def _classify_intent(self, query: str) -> str:
-        """Classify the intent of the query."""
-        query_lower = query.lower()
-        
-        # Classification rules
-        if any(word in query_lower for word in ['统计', '计算', '多少', '几个']):
-            return 'aggregation'
-        elif any(word in query_lower for word in ['最高', '最大', '最低', '最小']):
-            return 'extreme'
-        elif any(word in query_lower for word in ['平均', '均值']):
-            return 'average'
-        elif any(word in query_lower for word in ['排名', '排行', 'top']):
-            return 'ranking'
-        elif any(word in query_lower for word in ['趋势', '变化', '增长']):
-            return 'trend'
-        elif any(word in query_lower for word in ['占比', '比例', '百分比']):
-            return 'proportion'
-        else:
-            return 'simple'
+    def _find_keywords(self, query: str) -> Set[str]:
+        """Find every intent and aggregation keyword in the query."""
+        found = set()
+        for longest in self._keyword_re.findall(query.lower()):
+            found.update(self._keyword_prefixes[longest])
+        return found
     
-    def _detect_aggregation(self, query: str) -> Optional[str]:
-        """Detect the type of aggregation needed."""
-        query_lower = query.lower()
+    def _classify_intent(self, keywords: Set[str]) -> str:
+        """Classify the intent of the query from its keywords."""
+        for intent, patterns in self.intent_patterns.items():
+            if not keywords.isdisjoint(patterns):
+                return intent
         
+        return 'simple'
+    
+    def _detect_aggregation(self, keywords: Set[str]) -> Optional[str]:
+        """Detect the type of aggregation needed from the query's keywords."""
         for agg_type, patterns in self.aggregation_patterns.items():
-            if any(pattern in query_lower for pattern in patterns):
+            if not keywords.isdisjoint(patterns):
                 return agg_type
         
         return None
     
+    @_cached_per_day
     def _get_week_range(self) -> Tuple[str, str]:
         """Get current week date range."""
         today = datetime.now()
@@ -209,6 +290,7 @@ class QueryParser:
         end_of_week = start_of_week + timedelta(days=6)
         return start_of_week.date().isoformat(), end_of_week.date().isoformat()
     
+    @_cached_per_day
     def _get_last_week_range(self) -> Tuple[str, str]:
         """Get last week date range."""
         today = datetime.now()
@@ -216,6 +298,7 @@ class QueryParser:
         end_of_last_week = start_of_last_week + timedelta(days=6)
         return start_of_last_week.date().isoformat(), end_of_last_week.date().isoformat()
     
+    @_cached_per_day
     def _get_month_range(self) -> Tuple[str, str]:
         """Get current month date range."""
         today = datetime.now()
@@ -223,6 +306,7 @@ class QueryParser:
         end_of_month = today
         return start_of_month.date().isoformat(), end_of_month.date().isoformat()
     
+    @_cached_per_day
     def _get_last_month_range(self) -> Tuple[str, str]:
         """Get last month date range."""
         today = datetime.now()
@@ -239,6 +323,7 @@ class QueryParser:
         end_of_last_month = next_month - timedelta(days=1)
         return last_month.date().isoformat(), end_of_last_month.date().isoformat()
     
+    @_cached_per_day
     def _get_year_range(self) -> Tuple[str, str]:
         """Get current year date range."""
         today = datetime.now()
@@ -246,6 +331,7 @@ class QueryParser:
         end_of_year = today
         return start_of_year.date().isoformat(), end_of_year.date().isoformat()
     
+    @_cached_per_day
     def _get_last_year_range(self) -> Tuple[str, str]:
         """Get last year date range."""
         today = datetime.now()
@@ -264,6 +350,9 @@ class QueryParser:
         Returns:
             Enhanced search query
         """
+        if not (parsed_info['entities'] or parsed_info['metrics'] or parsed_info['dimensions']):
+            return original_query
+        
         enhanced_parts = [original_query]
         
         # Add entities
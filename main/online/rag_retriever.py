@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import Dict, List, Any, Optional
 import re
 
@@ -6,22 +7,53 @@ from ..core import VectorDBManager
 from .query_parser import QueryParser
 from ..config import settings
 
+# Seconds a fetched business rules document is reused before re-reading it,
+# so rules rebuilt by another process are picked up
+BUSINESS_RULES_TTL = 300
+
+# Column name fragments that mark time columns
+_TIME_COLUMN_RE = re.compile('time|date|created|updated')
+
 
 class RAGRetriever:
     """Retrieves relevant schema information using RAG."""
     
-    def __init__(self):
-        """Initialize RAG retriever."""
+    def __init__(
+        self,
+        query_parser: Optional[QueryParser] = None,
+        vector_db: Optional[VectorDBManager] = None
+    ):
+        """
+        Initialize RAG retriever.
+        
+        Args:
+            query_parser: Parser to share with the caller, so a query parsed
+                by both is parsed once; a new one is created when omitted
+            vector_db: Vector DB manager to share with the caller; when
+                omitted, one is created on first use
+        """
         self.logger = logging.getLogger(__name__)
-        self.vector_db = VectorDBManager()
-        self.query_parser = QueryParser()
+        self._vector_db = vector_db
+        self.query_parser = query_parser or QueryParser()
         
+        # Business rules document and the monotonic time it was fetched
+        self._business_rules: Optional[str] = None
+        self._business_rules_fetched_at: Optional[float] = None
+    
+    @property
+    def vector_db(self) -> VectorDBManager:
+        """Vector DB manager, created on first use when none was given."""
+        if self._vector_db is None:
+            self._vector_db = VectorDBManager()
+        return self._vector_db
+    
     def retrieve_context(
         self, 
         query: str,
         top_k: int = None,
         score_threshold: float = None,
-        use_hybrid_search: bool = True
+        use_hybrid_search: bool = True,
+        parsed_query: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Retrieve relevant context for the query.
@@ -31,18 +63,21 @@ class RAGRetriever:
             top_k: Number of results to retrieve
             score_threshold: Minimum similarity score
             use_hybrid_search: Whether to use hybrid search
+            parsed_query: The query already parsed by the caller, if any
             
         Returns:
             Dictionary with retrieved context
         """
         try:
             # Parse query to extract entities and enhance search
-            parsed_query = self.query_parser.parse_query(query)
+            if parsed_query is None:
+                parsed_query = self.query_parser.parse_query(query)
             
             if use_hybrid_search:
                 # Use both original and enhanced queries
                 enhanced_query = self.query_parser.enhance_search_query(query, parsed_query)
-                search_queries = [query, enhanced_query]
+                # Nothing to add leaves the enhanced query equal to the original
+                search_queries = list(dict.fromkeys([query, enhanced_query]))
             else:
                 search_queries = [query]
             
@@ -52,25 +87,21 @@ class RAGRetriever:
             if score_threshold is None:
                 score_threshold = settings.rag_score_threshold
             
-            # Retrieve results for each query
-            all_results = []
-            for search_query in search_queries:
-                results = self.vector_db.search(
-                    query=search_query,
-                    top_k=top_k,
-                    where={'type': 'table'}  # Only search table schemas
-                )
-                
-                # Filter by score threshold
-                filtered_results = [
-                    r for r in results 
-                    if r['distance'] <= (1 - score_threshold)
-                ]
-                
-                all_results.extend(filtered_results)
+            # Retrieve results for all queries in one batch
+            batched_results = self.vector_db.search_batch(
+                search_queries,
+                top_k=top_k,
+                where={'type': 'table'}  # Only search table schemas
+            )
             
-            # Deduplicate results
-            unique_results = self._deduplicate_results(all_results)
+            # Filter by score threshold, keeping the first hit per document
+            max_distance = 1 - score_threshold
+            unique_by_id = {}
+            for results in batched_results:
+                for result in results:
+                    if result['distance'] <= max_distance:
+                        unique_by_id.setdefault(result['id'], result)
+            unique_results = list(unique_by_id.values())
             
             # Extract related tables and build context
             context = self._build_context(unique_results, parsed_query)
@@ -92,29 +123,38 @@ class RAGRetriever:
         Returns:
             Dictionary mapping table names to their schema documents
         """
-        schemas = {}
+        # One lookup for all tables; missing ones are simply absent
+        results = self.vector_db.get_documents([f"table_{name}" for name in table_names])
         
+        schemas = {}
         for table_name in table_names:
-            try:
-                result = self.vector_db.get_document(f"table_{table_name}")
-                if result:
-                    schemas[table_name] = result['document']
-            except Exception as e:
-                self.logger.warning(f"Could not retrieve schema for {table_name}: {e}")
+            result = results.get(f"table_{table_name}")
+            if result:
+                schemas[table_name] = result['document']
         
         return schemas
     
     def retrieve_business_rules(self) -> Optional[str]:
-        """Retrieve business rules from knowledge base."""
+        """Retrieve business rules from knowledge base, cached for BUSINESS_RULES_TTL seconds."""
+        now = time.monotonic()
+        if (self._business_rules_fetched_at is not None
+                and now - self._business_rules_fetched_at < BUSINESS_RULES_TTL):
+            return self._business_rules
+        
         try:
             result = self.vector_db.get_document('business_rules')
-            if result:
-                return result['document']
-            return None
+            self._business_rules = result['document'] if result else None
+            self._business_rules_fetched_at = now
+            return self._business_rules
         except Exception as e:
             self.logger.warning(f"Could not retrieve business rules: {e}")
             return None
     
+    def invalidate_business_rules(self) -> None:
+        """Forget the cached business rules so the next call re-reads them."""
+        self._business_rules = None
+        self._business_rules_fetched_at = None
+    
     def find_related_tables(self, query: str, current_tables: List[str]) -> List[str]:
         """
         Find additional tables that might be related to the query.
@@ -133,38 +173,30 @@ class RAGRetriever:
             
             # Search for tables containing these entities
             additional_tables = []
+            seen = set(current_tables)
             
-            for entity in entities:
-                # Look for tables with entity in name or columns
-                results = self.vector_db.search(
-                    query=entity,
-                    top_k=5,
-                    where={'type': 'table'}
-                )
-                
+            # Look for tables with each entity in name or columns
+            batched_results = self.vector_db.search_batch(
+                entities,
+                top_k=5,
+                where={'type': 'table'}
+            )
+            
+            for results in batched_results:
                 for result in results:
                     table_name = result['metadata']['table_name']
-                    if table_name not in current_tables and table_name not in additional_tables:
+                    if table_name not in seen:
+                        seen.add(table_name)
                         additional_tables.append(table_name)
+                        if len(additional_tables) == 2:  # Limit to 2 additional tables
+                            return additional_tables
             
-            return additional_tables[:2]  # Limit to 2 additional tables
+            return additional_tables
             
         except Exception as e:
             self.logger.error(f"Error finding related tables: {e}")
             return []
     
-    def _deduplicate_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Remove duplicate results based on document ID."""
-        seen_ids = set()
-        unique_results = []
-        
-        for result in results:
-            if result['id'] not in seen_ids:
-                seen_ids.add(result['id'])
-                unique_results.append(result)
-        
-        return unique_results
-    
     def _build_context(
         self, 
         results: List[Dict[str, Any]], 
@@ -185,6 +217,7 @@ class RAGRetriever:
         
         # Process each table
         table_names = []
+        schema_parts = []
         for result in results:
             table_name = result['metadata']['table_name']
             table_names.append(table_name)
@@ -198,8 +231,10 @@ class RAGRetriever:
             })
             
             # Build schema text for LLM
-            context['schema_text'] += f"\n\n--- Table: {table_name} ---\n"
-            context['schema_text'] += result['document']
+            schema_parts.append(f"\n\n--- Table: {table_name} ---\n")
+            schema_parts.append(result['document'])
+        
+        context['schema_text'] = ''.join(schema_parts)
         
         # Extract relationships between tables
         if len(table_names) > 1:
@@ -216,23 +251,24 @@ class RAGRetriever:
         """Extract foreign key relationships between tables."""
         relationships = []
         
-        # Build a map of tables by name
-        table_map = {table['name']: table for table in tables}
+        # Names of the tables in our result set
+        table_names = {table['name'] for table in tables}
         
         # Check each table for foreign keys
         for table in tables:
             foreign_keys = table['metadata'].get('foreign_keys', [])
             
             for fk in foreign_keys:
-                referenced_table = fk['references']['table']
+                references = fk['references']
+                referenced_table = references['table']
                 
                 # Only include relationships to tables in our result set
-                if referenced_table in table_map:
+                if referenced_table in table_names:
                     relationships.append({
                         'from_table': table['name'],
                         'from_column': fk['column'],
                         'to_table': referenced_table,
-                        'to_column': fk['references']['column']
+                        'to_column': references['column']
                     })
         
         return relationships
@@ -263,33 +299,23 @@ class RAGRetriever:
             entities = parsed_query['entities']
             metrics = parsed_query['metrics']
             
-            # Find relevant columns
-            relevant_columns = []
-            
-            # Check time columns
-            if parsed_query['time_range']['relative_time']:
-                time_columns = [col for col in columns if any(
-                    time_word in col.lower() 
-                    for time_word in ['time', 'date', 'created', 'updated']
-                )]
-                relevant_columns.extend(time_columns)
-            
-            # Check metric columns
-            for metric in metrics:
-                metric_columns = [col for col in columns if metric in col.lower()]
-                relevant_columns.extend(metric_columns)
+            # Find relevant columns: time columns for time-ranged queries,
+            # and columns naming any metric or entity, each in one scan
+            wants_time = bool(parsed_query['time_range']['relative_time'])
+            keywords = metrics + entities
+            keyword_re = re.compile('|'.join(map(re.escape, keywords))) if keywords else None
             
-            # Check entity columns
-            for entity in entities:
-                entity_columns = [col for col in columns if entity in col.lower()]
-                relevant_columns.extend(entity_columns)
+            relevant_columns = set()
+            for col in columns:
+                col_lower = col.lower()
+                if ((wants_time and _TIME_COLUMN_RE.search(col_lower))
+                        or (keyword_re is not None and keyword_re.search(col_lower))):
+                    relevant_columns.add(col)
             
             # Always include primary keys
-            pk_columns = metadata.get('primary_keys', [])
-            relevant_columns.extend(pk_columns)
+            relevant_columns.update(metadata.get('primary_keys', []))
             
-            # Remove duplicates
-            return list(set(relevant_columns))
+            return list(relevant_columns)
             
         except Exception as e:
             self.logger.error(f"Error getting relevant columns: {e}")
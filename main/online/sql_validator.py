@@ -1,15 +1,118 @@
 import logging
+import re
 from typing import Dict, List, Any, Optional, Tuple
 import sqlglot
 from sqlglot import transpile
 from sqlglot.errors import SqlglotError, ParseError
+import threading
 import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from functools import lru_cache
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 from ..config import settings
+from ..core.database import LIBPQ_DRIVERS, get_engine
+
+
+# validate_and_fix results kept per SQLValidator, by (sql, schema)
+VALIDATION_CACHE_SIZE = 256
+
+# "= value" comparisons whose value is a bare word, for quoting fixes
+_UNQUOTED_VALUE_RE = re.compile(r'= (\w+)(?=\s|$|,|\))')
+
+# Query types of non-SELECT statements, by AST root type
+_STATEMENT_TYPES = {
+    sqlglot.exp.Insert: 'insert',
+    sqlglot.exp.Update: 'update',
+    sqlglot.exp.Delete: 'delete'
+}
+
+# Dry-run statement prefix per dialect; other dialects only get a syntax check
+_DRY_RUN_PREFIXES = {
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'PREPARE test_plan AS '
+}
+
+# EXPLAIN prefix per dialect for explain_query, plain EXPLAIN otherwise
+_EXPLAIN_PREFIXES = {
+    'mysql': 'EXPLAIN FORMAT=JSON ',
+    'postgresql': 'EXPLAIN (ANALYZE, FORMAT JSON) '
+}
+_DEFAULT_EXPLAIN_PREFIX = 'EXPLAIN '
+
+# AST node types validate_semantics checks against the schema
+_REFERENCE_TYPES = (sqlglot.exp.Table, sqlglot.exp.Column)
+
+
+@lru_cache(maxsize=1024)
+def _parse_sql(sql: str, dialect: str) -> tuple:
+    """
+    Parse SQL once per (sql, dialect); the correction loop and /validate
+    re-check the same statements repeatedly. Callers must not mutate the
+    returned ASTs.
+    """
+    return tuple(sqlglot.parse(sql, dialect=dialect))
+
+
+@lru_cache(maxsize=1024)
+def _sql_references(sql: str, dialect: str) -> Tuple[frozenset, frozenset, Dict[str, frozenset]]:
+    """
+    Table names and column references of the first statement, walked once
+    per (sql, dialect) on top of the cached parse. Returns the tables, the
+    unqualified column names, and qualified column names grouped by their
+    table qualifier. Callers must not mutate the returned mapping.
+    """
+    parsed = _parse_sql(sql, dialect)[0]
+    
+    # One walk collects both kinds of reference, columns already grouped
+    tables_in_query = set()
+    unqualified_columns = set()
+    qualified_columns: Dict[str, set] = {}
+    for node in parsed.walk():
+        if isinstance(node, _REFERENCE_TYPES):
+            if isinstance(node, sqlglot.exp.Column):
+                if node.table:
+                    qualified_columns.setdefault(node.table, set()).add(node.name)
+                else:
+                    unqualified_columns.add(node.name)
+            else:
+                tables_in_query.add(node.name)
+    return (
+        frozenset(tables_in_query),
+        frozenset(unqualified_columns),
+        {table: frozenset(columns) for table, columns in qualified_columns.items()}
+    )
+
+
+def _mysql_plan_cost(plan_results: List[Dict[str, Any]]) -> Optional[float]:
+    """Query cost from MySQL EXPLAIN FORMAT=JSON output."""
+    plan_json = plan_results[0].get('EXPLAIN', {})
+    return plan_json.get('query_block', {}).get('cost_info', {}).get('query_cost')
+
+
+def _postgresql_plan_cost(plan_results: List[Dict[str, Any]]) -> Optional[float]:
+    """Total cost from PostgreSQL EXPLAIN (ANALYZE, FORMAT JSON) output."""
+    plan_json = plan_results[0].get('QUERY PLAN', [{}])[0]
+    return plan_json.get('Plan', {}).get('Total Cost')
+
+
+# Plan cost readers per dialect, matching _EXPLAIN_PREFIXES
+_PLAN_COST_EXTRACTORS = {
+    'mysql': _mysql_plan_cost,
+    'postgresql': _postgresql_plan_cost
+}
+
+
+@lru_cache(maxsize=16)
+def _timeout_statement(timeout_ms: int):
+    """
+    SET LOCAL statement_timeout clause, built once per timeout value.
+    PostgreSQL takes no bind parameters in SET, so the value is inlined.
+    """
+    return text(f"SET LOCAL statement_timeout TO {timeout_ms}")
 
 
 class SQLValidator:
@@ -21,6 +124,10 @@ class SQLValidator:
         self.engine = None
         self.dialect = settings.db_type
         
+        # (sql, schema fingerprint) -> validate_and_fix result, oldest first
+        self._validation_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._validation_lock = threading.Lock()
+        
     def connect(self, database_url: str = None) -> None:
         """
         Connect to the database for execution.
@@ -32,7 +139,9 @@ class SQLValidator:
             if database_url is None:
                 database_url = settings.database_url
                 
-            self.engine = create_engine(database_url)
+            self.engine = get_engine(database_url)
+            # Dry runs against another database may turn out differently
+            self.clear_validation_cache()
             self.logger.info("Connected to database for SQL validation")
         except Exception as e:
             self.logger.error(f"Failed to connect to database: {e}")
@@ -50,7 +159,7 @@ class SQLValidator:
         """
         try:
             # Parse SQL with sqlglot
-            parsed = sqlglot.parse(sql, dialect=self.dialect)
+            parsed = _parse_sql(sql, self.dialect)
             
             # If parsing succeeds, syntax is valid
             if parsed:
@@ -84,51 +193,27 @@ class SQLValidator:
             Tuple of (is_valid, error_message)
         """
         try:
-            # Parse SQL
-            parsed = sqlglot.parse(sql, dialect=self.dialect)[0]
-            
-            # Extract table and column references
-            tables_in_query = set()
-            columns_in_query = set()
-            
-            # Traverse the AST
-            for table in parsed.find_all(sqlglot.exp.Table):
-                tables_in_query.add(table.name)
-            
-            for column in parsed.find_all(sqlglot.exp.Column):
-                if column.table:
-                    columns_in_query.add(f"{column.table.name}.{column.name}")
-                else:
-                    columns_in_query.add(column.name)
+            # Extract table and column references from the cached AST;
+            # unqualified columns are checked against every table,
+            # qualified ones against their own
+            tables_in_query, unqualified_columns, qualified_columns = _sql_references(sql, self.dialect)
             
             # Check against schema
-            available_tables = {t['name'] for t in schema_context.get('tables', [])}
+            table_columns_index = self._table_columns_index(schema_context)
             
             # Validate tables
-            invalid_tables = tables_in_query - available_tables
+            invalid_tables = tables_in_query - table_columns_index.keys()
             if invalid_tables:
                 return False, f"Invalid table(s): {', '.join(invalid_tables)}"
             
             # Validate columns (simplified check)
             for table_name in tables_in_query:
-                table_info = next(
-                    (t for t in schema_context.get('tables', []) if t['name'] == table_name),
-                    None
-                )
+                available_columns = table_columns_index[table_name]
+                table_columns = unqualified_columns | qualified_columns.get(table_name, frozenset())
                 
-                if table_info:
-                    available_columns = set(table_info['metadata']['columns'])
-                    
-                    # Check columns from this table
-                    table_columns = {
-                        col.split('.')[1] if '.' in col else col
-                        for col in columns_in_query
-                        if col.startswith(table_name + '.') or '.' not in col
-                    }
-                    
-                    invalid_columns = table_columns - available_columns
-                    if invalid_columns:
-                        return False, f"Invalid column(s) in table {table_name}: {', '.join(invalid_columns)}"
+                invalid_columns = table_columns - available_columns
+                if invalid_columns:
+                    return False, f"Invalid column(s) in table {table_name}: {', '.join(invalid_columns)}"
             
             self.logger.debug("SQL semantic validation passed")
             return True, None
@@ -138,6 +223,22 @@ class SQLValidator:
             self.logger.error(error_msg)
             return False, error_msg
     
+    def _table_columns_index(self, schema_context: Dict[str, Any]) -> Dict[str, frozenset]:
+        """
+        Map each table in the context to its column names.
+        
+        Built once per context and stored on it, so re-validating during
+        correction reuses it.
+        """
+        index = schema_context.get('_table_columns')
+        if index is None:
+            index = {}
+            for table in schema_context.get('tables', []):
+                # First entry wins for duplicate names
+                index.setdefault(table['name'], frozenset(table['metadata']['columns']))
+            schema_context['_table_columns'] = index
+        return index
+    
     def dry_run(self, sql: str) -> Tuple[bool, Optional[str]]:
         """
         Perform dry run execution of SQL.
@@ -152,20 +253,14 @@ class SQLValidator:
             self.connect()
         
         try:
-            # Different databases have different ways to do dry run
-            if self.dialect == "mysql":
-                # MySQL: Use EXPLAIN
-                explain_sql = f"EXPLAIN {sql}"
-                with self._execute_with_timeout(explain_sql):
-                    pass
-            elif self.dialect == "postgresql":
-                # PostgreSQL: Use PREPARE
-                prepared_sql = f"PREPARE test_plan AS {sql}"
-                with self._execute_with_timeout(prepared_sql):
-                    pass
-            else:
+            # Different databases have different ways to do dry run:
+            # EXPLAIN on MySQL, PREPARE on PostgreSQL
+            prefix = _DRY_RUN_PREFIXES.get(self.dialect)
+            if prefix is None:
                 # Generic: Try to parse and validate
                 return self.validate_syntax(sql)
+            with self._execute_with_timeout(prefix + sql):
+                pass
             
             self.logger.debug("SQL dry run successful")
             return True, None
@@ -202,9 +297,7 @@ class SQLValidator:
             with self._execute_with_timeout(sql, timeout) as result:
                 if fetch_results and result:
                     # Convert to list of dictionaries
-                    columns = [col[0] for col in result.cursor.description]
-                    rows = result.fetchall()
-                    results = [dict(zip(columns, row)) for row in rows]
+                    results = [dict(row) for row in result.mappings()]
                 else:
                     results = None
                 
@@ -230,12 +323,7 @@ class SQLValidator:
             self.connect()
         
         try:
-            if self.dialect == "mysql":
-                explain_sql = f"EXPLAIN FORMAT=JSON {sql}"
-            elif self.dialect == "postgresql":
-                explain_sql = f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"
-            else:
-                explain_sql = f"EXPLAIN {sql}"
+            explain_sql = _EXPLAIN_PREFIXES.get(self.dialect, _DEFAULT_EXPLAIN_PREFIX) + sql
             
             success, results, error = self.execute_query(explain_sql)
             
@@ -267,10 +355,46 @@ class SQLValidator:
         Returns:
             Tuple of (is_valid, fixed_sql, error_message)
         """
+        key = (sql, frozenset(self._table_columns_index(schema_context).items()))
+        with self._validation_lock:
+            cached = self._validation_cache.get(key)
+            if cached is not None:
+                self._validation_cache.move_to_end(key)
+                self.logger.debug("Validation cache hit")
+                return cached
+        
+        result, cacheable = self._validate_and_fix(sql, schema_context)
+        
+        if cacheable:
+            with self._validation_lock:
+                self._validation_cache[key] = result
+                while len(self._validation_cache) > VALIDATION_CACHE_SIZE:
+                    self._validation_cache.popitem(last=False)
+        
+        return result
+    
+    def clear_validation_cache(self) -> None:
+        """Forget cached validate_and_fix results, e.g. after a schema change."""
+        with self._validation_lock:
+            self._validation_cache.clear()
+    
+    def _validate_and_fix(
+        self,
+        sql: str,
+        schema_context: Dict[str, Any]
+    ) -> Tuple[Tuple[bool, str, Optional[str]], bool]:
+        """
+        Run validate_and_fix's checks.
+        
+        Returns:
+            The (is_valid, fixed_sql, error_message) result, and whether it
+            may be cached: a failed dry run can be transient (lock timeout,
+            lost connection), so it is always re-checked
+        """
         # 1. Syntax validation
         is_valid, error = self.validate_syntax(sql)
         if not is_valid:
-            return False, sql, error
+            return (False, sql, error), True
         
         # 2. Semantic validation
         is_valid, error = self.validate_semantics(sql, schema_context)
@@ -283,15 +407,15 @@ class SQLValidator:
                 if is_valid:
                     is_valid, error = self.validate_semantics(fixed_sql, schema_context)
                     if is_valid:
-                        return True, fixed_sql, None
-            return False, sql, error
+                        return (True, fixed_sql, None), True
+            return (False, sql, error), True
         
         # 3. Dry run
         is_valid, error = self.dry_run(sql)
         if not is_valid:
-            return False, sql, error
+            return (False, sql, error), False
         
-        return True, sql, None
+        return (True, sql, None), True
     
     @contextmanager
     def _execute_with_timeout(self, sql: str, timeout: int = None):
@@ -300,9 +424,20 @@ class SQLValidator:
             timeout = settings.sql_timeout
         
         with self.engine.connect() as conn:
-            # Set statement timeout if supported
+            # Set statement timeout if supported; libpq drivers already
+            # carry the default one from connect time
             if self.dialect == "postgresql":
-                conn.execute(text(f"SET statement_timeout TO {timeout * 1000}"))
+                driver = self.engine.dialect.driver
+                if driver not in LIBPQ_DRIVERS or timeout != settings.sql_timeout:
+                    set_timeout = _timeout_statement(timeout * 1000)
+                    if driver == "psycopg2":
+                        # psycopg2 sends both statements in one simple-protocol
+                        # round trip and returns the last one's result; SET LOCAL
+                        # lasts until the rollback when the connection is returned
+                        result = conn.execute(text(f"{set_timeout.text}; {sql}"))
+                        yield result
+                        return
+                    conn.execute(set_timeout)
             
             # Execute query
             result = conn.execute(text(sql))
@@ -314,15 +449,11 @@ class SQLValidator:
         
         # Fix missing quotes around string literals
         if "Unknown column" in error:
-            # Try to identify unquoted strings
-            import re
-            pattern = r'= (\w+)(?:\s|$|,|\))'
-            matches = re.findall(pattern, sql)
-            
-            for match in matches:
-                if match.isdigit():
-                    continue  # Don't quote numbers
-                fixed_sql = fixed_sql.replace(f"= {match}", f"= '{match}'")
+            # Quote unquoted strings in one pass; numbers are left alone
+            fixed_sql = _UNQUOTED_VALUE_RE.sub(
+                lambda match: match.group(0) if match.group(1).isdigit() else f"= '{match.group(1)}'",
+                fixed_sql
+            )
         
         # Fix missing table prefixes in column names
         if "Column" in error and "in field list" in error:
@@ -334,15 +465,9 @@ class SQLValidator:
     def _extract_cost_from_plan(self, plan_results: List[Dict[str, Any]]) -> Optional[float]:
         """Extract estimated cost from execution plan."""
         try:
-            if self.dialect == "mysql" and plan_results:
-                # MySQL EXPLAIN FORMAT=JSON
-                plan_json = plan_results[0].get('EXPLAIN', {})
-                return plan_json.get('query_block', {}).get('cost_info', {}).get('query_cost')
-            
-            elif self.dialect == "postgresql" and plan_results:
-                # PostgreSQL EXPLAIN ANALYZE
-                plan_json = plan_results[0].get('QUERY PLAN', [{}])[0]
-                return plan_json.get('Plan', {}).get('Total Cost')
+            extract_cost = _PLAN_COST_EXTRACTORS.get(self.dialect)
+            if extract_cost and plan_results:
+                return extract_cost(plan_results)
             
             return None
             
@@ -351,21 +476,20 @@ class SQLValidator:
             return None
     
     def _classify_query_type(self, sql: str) -> str:
-        """Classify the type of SQL query."""
-        sql_upper = sql.upper().strip()
+        """Classify the type of SQL query from its (cached) AST."""
+        try:
+            statements = _parse_sql(sql, self.dialect)
+        except SqlglotError:
+            return 'other'
         
-        if sql_upper.startswith('SELECT'):
-            if 'GROUP BY' in sql_upper:
+        # Blank input parses to no statement or a lone None
+        parsed = statements[0] if statements else None
+        if isinstance(parsed, sqlglot.exp.Select):
+            if parsed.find(sqlglot.exp.Group) is not None:
                 return 'aggregation'
-            elif 'JOIN' in sql_upper:
+            elif parsed.find(sqlglot.exp.Join) is not None:
                 return 'join'
             else:
                 return 'simple_select'
-        elif sql_upper.startswith('INSERT'):
-            return 'insert'
-        elif sql_upper.startswith('UPDATE'):
-            return 'update'
-        elif sql_upper.startswith('DELETE'):
-            return 'delete'
-        else:
-            return 'other'
\ No newline at end of file
+        
+        return _STATEMENT_TYPES.get(type(parsed), 'other')
@@ -2,13 +2,16 @@
 Text2SQL: Main orchestrator for RAG-based Text-to-SQL system.
 """
 
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable
 import json
+import numpy as np
+import orjson
 from datetime import datetime
 
 from .config import settings
-from .core import LLMManager, EmbeddingManager, VectorDBManager
+from .core import LLMManager, EmbeddingManager, VectorDBManager, SemanticCache
 from .offline import MetadataSync, KnowledgeBaseBuilder
 from .online import QueryParser, RAGRetriever, PromptBuilder, SQLValidator
 
@@ -16,6 +19,9 @@ from .online import QueryParser, RAGRetriever, PromptBuilder, SQLValidator
 class Text2SQL:
     """Main Text2SQL orchestrator."""
     
+    # Shared instances keyed by database URL, see shared()
+    _instances: Dict[Optional[str], "Text2SQL"] = {}
+    
     def __init__(self, database_url: str = None):
         """
         Initialize Text2SQL system.
@@ -27,9 +33,18 @@ class Text2SQL:
         self.database_url = database_url or settings.database_url
         
         # Initialize components
-        self.llm_manager = LLMManager()
         self.embedding_manager = EmbeddingManager()
         self.vector_db = VectorDBManager()
+        self.semantic_cache = (
+            SemanticCache(self.embedding_manager)
+            if settings.semantic_cache_enabled else None
+        )
+        # Generated SQL is cached separately so requests that bypass the
+        # result cache (intermediate output, failed execution) still reuse it
+        self.llm_manager = LLMManager(
+            sql_cache=SemanticCache(self.embedding_manager)
+            if settings.semantic_cache_enabled else None
+        )
         
         # Offline processing
         self.metadata_sync = MetadataSync()
@@ -37,13 +52,37 @@ class Text2SQL:
         
         # Online processing
         self.query_parser = QueryParser()
-        self.rag_retriever = RAGRetriever()
+        self.rag_retriever = RAGRetriever(self.query_parser, self.vector_db)
         self.prompt_builder = PromptBuilder()
         self.sql_validator = SQLValidator()
         
+        # Knowledge base document count, fetched on first use and dropped
+        # whenever this instance writes to the knowledge base
+        self._kb_size: Optional[int] = None
+        
         # Initialize database connections
         self._initialize_connections()
     
+    @classmethod
+    def shared(cls, database_url: str = None) -> "Text2SQL":
+        """
+        Get the process-wide instance for a database URL, creating it once.
+        
+        Args:
+            database_url: Database connection URL
+            
+        Returns:
+            Shared Text2SQL instance
+        """
+        if database_url not in cls._instances:
+            cls._instances[database_url] = cls(database_url=database_url)
+        return cls._instances[database_url]
+    
+    def warm_up(self) -> None:
+        """Preload the models so the first query does not pay their load."""
+        self.llm_manager.warm_up()
+        self.embedding_manager.model  # first access loads it
+    
     def _initialize_connections(self):
         """Initialize database connections."""
         try:
@@ -67,18 +106,21 @@ class Text2SQL:
         """
         try:
             # Check if knowledge base exists
-            if not force_rebuild and self.vector_db.count_documents() > 0:
+            if not force_rebuild and self._knowledge_base_size() > 0:
                 self.logger.info("Knowledge base already exists. Use force_rebuild=True to rebuild.")
                 return
             
             self.logger.info("Building knowledge base...")
             
-            # Extract metadata and build knowledge base
+            # Extract metadata and build knowledge base; a failed build may
+            # still have written documents
+            self._kb_size = None
             self.knowledge_base.build_from_database(
                 database_url=self.database_url,
                 business_rules=business_rules
             )
             
+            self._invalidate_cache()
             self.logger.info("Knowledge base built successfully!")
             
         except Exception as e:
@@ -89,7 +131,8 @@ class Text2SQL:
         self,
         query: str,
         max_correction_attempts: int = None,
-        return_intermediate: bool = False
+        return_intermediate: bool = False,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """
         Convert natural language query to SQL.
@@ -98,6 +141,8 @@ class Text2SQL:
             query: Natural language query
             max_correction_attempts: Maximum correction attempts
             return_intermediate: Whether to return intermediate results
+            on_event: Optional callback receiving (event_name, data) as the
+                pipeline progresses: retrieved_context, draft_sql, correction
             
         Returns:
             Dictionary with results
@@ -105,32 +150,22 @@ class Text2SQL:
         if max_correction_attempts is None:
             max_correction_attempts = settings.max_correction_attempts
         
-        result = {
-            'query': query,
-            'sql': None,
-            'is_valid': False,
-            'execution_results': None,
-            'correction_attempts': 0,
-            'intermediate': {} if return_intermediate else None
-        }
+        # Intermediate results are never cached, so those requests bypass it
+        use_cache = self.semantic_cache is not None and not return_intermediate
+        cached, cache_embedding = self._lookup_cached_result(query, use_cache)
+        if cached is not None:
+            return {**cached, 'query': query}
+        
+        result = self._new_result(query, return_intermediate)
         
         try:
-            # 1. Parse query
-            parsed_query = self.query_parser.parse_query(query)
-            if return_intermediate:
-                result['intermediate']['parsed_query'] = parsed_query
-            
-            # 2. Retrieve relevant context
-            context = self.rag_retriever.retrieve_context(query)
-            if return_intermediate:
-                result['intermediate']['retrieved_context'] = {
-                    'tables': [t['name'] for t in context['tables']],
-                    'relationships': context['relationships']
-                }
+            # 1-2. Parse query and retrieve relevant context
+            parsed_query, context = self._parse_and_retrieve(query, result, on_event)
             
             # 3. Generate initial SQL
-            sql = self._generate_sql(query, context, parsed_query)
+            sql = self._generate_sql(query, context, parsed_query, cache_embedding)
             result['sql'] = sql
+            self._emit(on_event, 'draft_sql', {'sql': sql})
             
             # 4. Validate and execute
             is_valid, fixed_sql, error = self.sql_validator.validate_and_fix(
@@ -138,25 +173,13 @@ class Text2SQL:
             )
             
             if is_valid:
-                result['sql'] = fixed_sql
-                result['is_valid'] = True
-                
                 # Execute the query
-                success, execution_results, exec_error = self.sql_validator.execute_query(fixed_sql)
-                if success:
-                    result['execution_results'] = execution_results
-                else:
-                    result['execution_error'] = exec_error
+                self._record_valid_sql(result, fixed_sql, context, cache_embedding)
             else:
                 # 5. Try to correct if validation failed
                 for attempt in range(1, max_correction_attempts + 1):
                     self.logger.info(f"Correction attempt {attempt}/{max_correction_attempts}")
                     
-                    # Generate correction prompt
-                    correction_prompt = self.prompt_builder.build_correction_prompt(
-                        query, sql, error, context, attempt
-                    )
-                    
                     # Generate corrected SQL
                     corrected_sql = self.llm_manager.correct_sql(
                         query, sql, error, context['schema_text']
@@ -166,36 +189,273 @@ class Text2SQL:
                     is_valid, fixed_sql, error = self.sql_validator.validate_and_fix(
                         corrected_sql, context
                     )
+                    self._emit_correction(on_event, attempt, corrected_sql, is_valid, fixed_sql, error)
                     
                     if is_valid:
-                        result['sql'] = fixed_sql
-                        result['is_valid'] = True
                         result['correction_attempts'] = attempt
                         
                         # Execute corrected query
-                        success, execution_results, exec_error = self.sql_validator.execute_query(fixed_sql)
-                        if success:
-                            result['execution_results'] = execution_results
-                        else:
-                            result['execution_error'] = exec_error
+                        self._record_valid_sql(result, fixed_sql, context, cache_embedding)
                         break
                     else:
                         sql = corrected_sql
                 
                 if not result['is_valid']:
-                    result['error'] = f"Failed after {max_correction_attempts} correction attempts. Last error: {error}"
+                    self._record_failure(result, max_correction_attempts, error)
+            
+        except Exception as e:
+            self.logger.error(f"Error in query_to_sql: {e}")
+            result['error'] = str(e)
+        
+        self._cache_result(query, result, use_cache, cache_embedding)
+        return result
+    
+    async def aquery_to_sql(
+        self,
+        query: str,
+        max_correction_attempts: int = None,
+        return_intermediate: bool = False,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of query_to_sql that corrects speculatively.
+        
+        If the first SQL fails validation, all correction attempts are
+        requested from the LLM at once with different seeds, and each
+        answer is validated as it arrives. The first valid one wins and
+        the rest are cancelled, so a failed draft costs one LLM round trip
+        instead of up to max_correction_attempts. Corrections all start
+        from the first error rather than building on each other.
+        Blocking steps run in worker threads.
+        
+        Args:
+            query: Natural language query
+            max_correction_attempts: Maximum correction attempts
+            return_intermediate: Whether to return intermediate results
+            on_event: Optional callback, as for query_to_sql; it may be
+                called from a worker thread
+            
+        Returns:
+            Dictionary with results, as from query_to_sql
+        """
+        if max_correction_attempts is None:
+            max_correction_attempts = settings.max_correction_attempts
+        
+        # Intermediate results are never cached, so those requests bypass it
+        use_cache = self.semantic_cache is not None and not return_intermediate
+        cached, cache_embedding = await asyncio.to_thread(self._lookup_cached_result, query, use_cache)
+        if cached is not None:
+            return {**cached, 'query': query}
+        
+        result = self._new_result(query, return_intermediate)
+        
+        try:
+            # 1-2. Parse query and retrieve relevant context
+            parsed_query, context = await asyncio.to_thread(
+                self._parse_and_retrieve, query, result, on_event
+            )
+            
+            # 3. Generate initial SQL
+            sql = await asyncio.to_thread(self._generate_sql, query, context, parsed_query, cache_embedding)
+            result['sql'] = sql
+            self._emit(on_event, 'draft_sql', {'sql': sql})
+            
+            # 4. Validate and execute
+            is_valid, fixed_sql, error = await asyncio.to_thread(
+                self.sql_validator.validate_and_fix, sql, context
+            )
+            
+            if is_valid:
+                await asyncio.to_thread(self._record_valid_sql, result, fixed_sql, context, cache_embedding)
+            else:
+                # 5. Request every correction at once, validate as they arrive
+                self.logger.info(f"Requesting {max_correction_attempts} corrections concurrently")
+                corrections = [
+                    asyncio.ensure_future(self.llm_manager.acorrect_sql(
+                        query, sql, error, context['schema_text'], seed=seed
+                    ))
+                    for seed in range(max_correction_attempts)
+                ]
+                try:
+                    for attempt, correction in enumerate(asyncio.as_completed(corrections), 1):
+                        try:
+                            corrected_sql = await correction
+                        except Exception as e:
+                            self.logger.warning(f"Correction attempt {attempt} failed: {e}")
+                            error = str(e)
+                            continue
+                        
+                        is_valid, fixed_sql, error = await asyncio.to_thread(
+                            self.sql_validator.validate_and_fix, corrected_sql, context
+                        )
+                        self._emit_correction(on_event, attempt, corrected_sql, is_valid, fixed_sql, error)
+                        
+                        if is_valid:
+                            result['correction_attempts'] = attempt
+                            await asyncio.to_thread(self._record_valid_sql, result, fixed_sql, context, cache_embedding)
+                            break
+                finally:
+                    # Consume every outcome and let cancellation finish, so
+                    # no failed or cancelled request is left unretrieved
+                    for correction in corrections:
+                        correction.cancel()
+                    await asyncio.gather(*corrections, return_exceptions=True)
+                
+                if not result['is_valid']:
+                    self._record_failure(result, max_correction_attempts, error)
             
         except Exception as e:
             self.logger.error(f"Error in query_to_sql: {e}")
             result['error'] = str(e)
         
+        await asyncio.to_thread(self._cache_result, query, result, use_cache, cache_embedding)
         return result
     
+    @staticmethod
+    def _emit(
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]],
+        event: str,
+        data: Dict[str, Any]
+    ) -> None:
+        """Pass a pipeline event to the caller's callback, if any."""
+        if on_event is not None:
+            on_event(event, data)
+    
+    def _emit_correction(
+        self,
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]],
+        attempt: int,
+        corrected_sql: str,
+        is_valid: bool,
+        fixed_sql: str,
+        error: Optional[str]
+    ) -> None:
+        """Report one validated correction attempt."""
+        self._emit(on_event, 'correction', {
+            'attempt': attempt,
+            'sql': fixed_sql if is_valid else corrected_sql,
+            'is_valid': is_valid,
+            'error': error
+        })
+    
+    def _new_result(self, query: str, return_intermediate: bool) -> Dict[str, Any]:
+        """Empty result for a query, filled in as the pipeline runs."""
+        return {
+            'query': query,
+            'sql': None,
+            'is_valid': False,
+            'execution_results': None,
+            'correction_attempts': 0,
+            'intermediate': {} if return_intermediate else None
+        }
+    
+    def _parse_and_retrieve(
+        self,
+        query: str,
+        result: Dict[str, Any],
+        on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Parse a query and retrieve its schema context, recording both as
+        intermediate results when requested.
+        
+        Returns:
+            Tuple of (parsed_query, context)
+        """
+        intermediate = result['intermediate']
+        
+        # 1. Parse query
+        parsed_query = self.query_parser.parse_query(query)
+        if intermediate is not None:
+            intermediate['parsed_query'] = parsed_query
+        
+        # 2. Retrieve relevant context; retrieval starts from the parse,
+        # so the stages run in order and share it
+        context = self.rag_retriever.retrieve_context(query, parsed_query=parsed_query)
+        retrieved = {
+            'tables': [t['name'] for t in context['tables']],
+            'relationships': context['relationships']
+        }
+        if intermediate is not None:
+            intermediate['retrieved_context'] = retrieved
+        self._emit(on_event, 'retrieved_context', retrieved)
+        
+        return parsed_query, context
+    
+    def _record_failure(self, result: Dict[str, Any], max_correction_attempts: int, error: Optional[str]) -> None:
+        """Record that no attempt produced valid SQL."""
+        result['error'] = f"Failed after {max_correction_attempts} correction attempts. Last error: {error}"
+    
+    def _cache_result(
+        self,
+        query: str,
+        result: Dict[str, Any],
+        use_cache: bool,
+        cache_embedding: Optional[np.ndarray]
+    ) -> None:
+        """Cache a result that produced valid, executable SQL."""
+        if use_cache and result['is_valid'] and 'execution_error' not in result:
+            self.semantic_cache.put(query, result, embedding=cache_embedding)
+    
+    def _lookup_cached_result(
+        self,
+        query: str,
+        use_cache: bool
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Look up a cached result, embedding the query at most once.
+        
+        Args:
+            query: Natural language query
+            use_cache: Whether to consult the result cache
+            
+        Returns:
+            Tuple of (cached result or None, query embedding shared by the
+            result and SQL caches, or None when neither needs it)
+        """
+        # Exact repeats skip the embedding model entirely
+        if use_cache:
+            cached = self.semantic_cache.get_exact(query)
+            if cached is not None:
+                return cached, None
+        
+        if self.semantic_cache is None and self.llm_manager.sql_cache is None:
+            return None, None
+        
+        embedding = self.embedding_manager.embed_query(query)
+        if use_cache:
+            return self.semantic_cache.get(query, embedding=embedding), embedding
+        return None, embedding
+    
+    def _record_valid_sql(
+        self,
+        result: Dict[str, Any],
+        sql: str,
+        context: Dict[str, Any],
+        cache_embedding: Optional[np.ndarray] = None
+    ) -> None:
+        """Mark result valid with sql, cache the SQL and execute it, recording the outcome."""
+        result['sql'] = sql
+        result['is_valid'] = True
+        
+        # Only SQL that passed validation is reused for similar questions
+        self.llm_manager.cache_sql(
+            result['query'], sql, context['schema_text'],
+            context.get('business_rules'), cache_embedding
+        )
+        
+        success, execution_results, exec_error = self.sql_validator.execute_query(sql)
+        if success:
+            result['execution_results'] = execution_results
+        else:
+            result['execution_error'] = exec_error
+    
     def _generate_sql(
         self,
         query: str,
         context: Dict[str, Any],
-        parsed_query: Dict[str, Any]
+        parsed_query: Dict[str, Any],
+        cache_embedding: Optional[np.ndarray] = None
     ) -> str:
         """Generate SQL from query and context."""
         # Build prompt
@@ -209,7 +469,9 @@ class Text2SQL:
         sql = self.llm_manager.generate_sql(
             prompt=prompt,
             schema_context=context['schema_text'],
-            business_context=context.get('business_rules')
+            business_context=context.get('business_rules'),
+            cache_key=query,
+            cache_embedding=cache_embedding
         )
         
         return sql
@@ -261,6 +523,7 @@ class Text2SQL:
             rule_definition: Rule definition
         """
         self.knowledge_base.add_business_rule(rule_name, rule_definition)
+        self._invalidate_cache()
     
     def export_knowledge_base(self, file_path: str) -> None:
         """
@@ -270,14 +533,18 @@ class Text2SQL:
             file_path: Output file path
         """
         try:
-            # Get all documents
-            documents = self.vector_db.list_documents()
-            
-            # Export as JSON
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(documents, f, indent=2, ensure_ascii=False)
+            # Stream documents page by page into a JSON array, one per line,
+            # so the whole knowledge base is never held in memory
+            count = 0
+            with open(file_path, 'wb') as f:
+                f.write(b'[')
+                for document in self.vector_db.iter_documents():
+                    f.write(b',\n' if count else b'\n')
+                    f.write(orjson.dumps(document))
+                    count += 1
+                f.write(b'\n]\n')
             
-            self.logger.info(f"Knowledge base exported to {file_path}")
+            self.logger.info(f"Knowledge base exported to {file_path} ({count} documents)")
             
         except Exception as e:
             self.logger.error(f"Error exporting knowledge base: {e}")
@@ -303,7 +570,11 @@ class Text2SQL:
             metadatas = [doc.get('metadata', {}) for doc in documents]
             ids = [doc.get('id', str(i)) for i, doc in enumerate(documents)]
             
-            self.vector_db.add_documents(docs, metadatas, ids)
+            self.vector_db.add_documents(
+                docs, metadatas, ids,
+                embeddings=self.vector_db.embed_documents(docs)
+            )
+            self._invalidate_cache()
             
             self.logger.info(f"Knowledge base imported from {file_path}")
             
@@ -311,12 +582,28 @@ class Text2SQL:
             self.logger.error(f"Error importing knowledge base: {e}")
             raise
     
+    def _invalidate_cache(self) -> None:
+        """Drop cached query results, SQL, prompts and rules after the knowledge base changes."""
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
+        self.llm_manager.clear_sql_cache()
+        self.llm_manager.clear_prompt_cache()
+        self.rag_retriever.invalidate_business_rules()
+        self._kb_size = None
+    
+    def _knowledge_base_size(self) -> int:
+        """Number of documents in the knowledge base, counted once until it changes."""
+        if self._kb_size is None:
+            self._kb_size = self.vector_db.count_documents()
+        return self._kb_size
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get system statistics."""
         return {
-            'knowledge_base_size': self.vector_db.count_documents(),
+            'knowledge_base_size': self._knowledge_base_size(),
             'last_updated': datetime.now().isoformat(),
             'database_type': settings.db_type,
             'llm_model': settings.llm_model_name,
-            'embedding_model': settings.embedding_model_name
+            'embedding_model': settings.embedding_model_name,
+            'query_embedding_cache': self.rag_retriever.vector_db.query_cache_stats()
         }
\ No newline at end of file
@@ -14,7 +14,7 @@ setup(
         "langchain-community>=0.0.20",
         "langchain-core>=0.1.0",
         "langgraph>=0.0.40",
-        "sqlglot>=18.0.0",
+        "sqlglot[c]>=30.1.0",
         "sentence-transformers>=2.2.0",
         "torch>=2.0.0",
         "numpy>=1.24.0",
@@ -23,8 +23,11 @@ setup(
         "pymysql>=1.0.0",
         "psycopg2-binary>=2.9.0",
         "fastapi>=0.100.0",
+        "httpx>=0.24.0",
         "uvicorn>=0.20.0",
         "pydantic>=2.0.0",
+        "pydantic-settings>=2.0.0",
+        "orjson>=3.9.0",
         "python-dotenv>=1.0.0",
         "click>=8.0.0",
         "rich>=13.0.0",
@@ -33,10 +36,15 @@ setup(
         "plotly>=5.15.0",
     ],
     extras_require={
+        "ann": [
+            "faiss-cpu>=1.7.4",
+        ],
+        "jit": [
+            "numba>=0.58.0",
+        ],
         "dev": [
             "pytest>=7.4.0",
             "pytest-asyncio>=0.21.0",
-            "httpx>=0.24.0",
         ]
     },
     entry_points={
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from main.config import settings
+from main.core.embedding import EmbeddingManager
+
+
+def _unit_vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(params=["float32", "int8"])
+def precision(request, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_precision", request.param)
+    return request.param
+
+
+def test_register_and_search(precision):
+    docs = _unit_vectors(10)
+    manager = EmbeddingManager()
+    manager.register_documents(docs[:4])
+    manager.register_documents(docs[4:])
+    
+    results = manager.similarity_search(docs[3], top_k=3)
+    
+    assert results[0]["index"] == 3
+    assert results[0]["score"] == pytest.approx(1.0, abs=0.02)
+
+
+def test_save_load_register_search(precision, tmp_path):
+    docs = _unit_vectors(11)
+    manager = EmbeddingManager()
+    manager.register_documents(docs[:10])
+    manager.save_corpus(str(tmp_path / "corpus.npy"), ids=[str(i) for i in range(10)])
+    
+    loaded = EmbeddingManager()
+    ids = loaded.load_corpus(str(tmp_path / "corpus.npy"))
+    loaded.register_documents(docs[10:])
+    
+    assert ids == [str(i) for i in range(10)]
+    for i in (3, 10):
+        results = loaded.similarity_search(docs[i], top_k=2)
+        assert results[0]["index"] == i
+        assert results[0]["score"] == pytest.approx(1.0, abs=0.02)
+
+
+def test_loaded_corpus_matches_saved(precision, tmp_path):
+    docs = _unit_vectors(5)
+    manager = EmbeddingManager()
+    manager.register_documents(docs)
+    manager.save_corpus(str(tmp_path / "corpus.npy"))
+    
+    loaded = EmbeddingManager()
+    loaded.load_corpus(str(tmp_path / "corpus.npy"))
+    
+    np.testing.assert_allclose(loaded.document_matrix, docs, atol=0.02)
+
+
+def test_explicit_document_embeddings():
+    docs = _unit_vectors(6)
+    manager = EmbeddingManager()
+    
+    results = manager.similarity_search(docs[2], document_embeddings=docs, top_k=6)
+    
+    assert [r["index"] for r in results][0] == 2
+    assert len(results) == 6
+    assert manager.similarity_search(docs[2]) == []